@@ -1,8 +1,9 @@
-import pwd
-import subprocess
 import os
 from typing import Tuple
 
+from utilities.identity import to_uid, uid_of, username_of
+from utilities.slurm import get_slurm_partitions
+
 
 def from_dict(data):
     # Convert the list of lists into a list of tuples
@@ -13,28 +14,38 @@ def from_dict(data):
     )
 
 
+def network_from_dict(data):
+    # Restore the persisted resource index if present, older project files get it rebuilt on load
+    resource_index = None
+    if "resource_index" in data:
+        resource_index = {(resource_type, resource_path): context_id
+                          for resource_type, resource_path, context_id in data["resource_index"]}
+    # Contexts are handed over as raw records and only materialized when an operation touches them
+    return Network(
+        usernames=set(data["all_user_ids"]),
+        project_id=data["project_id"],
+        contexts=dict(data["contexts"]),
+        resource_index=resource_index,
+        journal_seq=data.get("journal_seq", 0),
+        recursive_resources=data.get("recursive_resources")
+    )
+
+
 class Context:
 
     def __init__(self, user_ids: set[str], resource_ids=None):
         if resource_ids is None:
             resource_ids = set()
 
-        try:    # case 1: user_ids are numeric identifiers
-            usernames = set([pwd.getpwuid(int(user_id)).pw_name for user_id in user_ids.copy()])
-            self.__id: str = ''.join(sorted(user_ids))
-
-        except ValueError as e:  # Case: user_ids are symbolic names
-            usernames = user_ids.copy()
-            user_ids = set([str(pwd.getpwnam(username).pw_uid) for username in user_ids.copy()])
-            self.__id: str = ''.join(sorted(user_ids))
-
-        self.__user_ids: set[str] = usernames
+        # Members may be given as numeric identifiers or as symbolic names, they are kept as integer uids
+        self.__user_ids: frozenset[int] = frozenset(to_uid(user_id) for user_id in user_ids)
+        self.__id: str = ''.join(sorted(str(uid) for uid in self.__user_ids))
         self.__resource_names: set[Tuple[int, str]] = resource_ids
 
     def to_dict(self):
         return {
             "id": self.__id,
-            "user_ids": list(self.__user_ids),
+            "user_ids": sorted(self.__user_ids),
             "resource_ids": list(self.__resource_names),
         }
 
@@ -42,7 +53,7 @@ class Context:
         return self.__id
 
     def get_users(self) -> set[str]:
-        return set([str(pwd.getpwnam(username).pw_uid) for username in self.__user_ids])
+        return set(str(uid) for uid in self.__user_ids)
 
     def get_resources(self) -> set[Tuple[int, str]]:
         return self.__resource_names
@@ -56,22 +67,116 @@ class Context:
 
 class Network:
 
-    def __init__(self, usernames: set[str], project_id: str, contexts=None):
+    def __init__(self, usernames: set[str], project_id: str, contexts=None, resource_index=None, journal_seq=0,
+                 recursive_resources=None):
 
         # Initialize the Network object
+        # A context is either a materialized Context or its raw record as read from the project file
         if contexts is None:
             contexts = dict()
         self.__project_id = project_id
         self.__all_usernames: set[str] = usernames
-        self.__contexts: dict[str, Context] = contexts
+        self.__contexts: dict[str, Context | dict] = contexts
+
+        # Inverted index: (resource_type, resource_path) -> id of the one context holding the resource
+        if resource_index is None:
+            resource_index = dict()
+            for context_id in self.__contexts.keys():
+                for resource in self.__context_resources(context_id):
+                    resource_index[resource] = context_id
+        self.__resource_index: dict[Tuple[int, str], str] = resource_index
+
+        # Directories whose privileges were propagated to everything below them
+        self.__recursive_resources: set[Tuple[int, str]] = set(
+            (resource_type, resource_path) for resource_type, resource_path in recursive_resources or [])
+
+        # Per-project user-ordinal table: each context's membership is kept as an integer bitmask
+        # so that superset, union and difference checks become word-level operations
+        self.__user_ordinals: dict[str, int] = dict()
+        self.__ordinal_users: list[str] = []
+        self.__context_masks: dict[str, int] = dict()
+        for context_id in self.__contexts.keys():
+            self.__context_masks[context_id] = self.users_to_mask(self.__context_users(context_id))
+
+        # Mutations applied since the network was loaded, to be appended to the project journal
+        # journal_seq is the sequence number of the last mutation folded into this network
+        self.__journal_seq: int = journal_seq
+        self.__mutations: list = []
+        self.__pending_removals: dict[Tuple[int, str], int] = dict()
+        self.__replaying = False
 
     def to_dict(self):
         return {
             "project_id": self.__project_id,
             "all_user_ids": list(self.__all_usernames),
-            "contexts": {key: context.to_dict() for key, context in self.__contexts.items()}
+            "contexts": {key: context if isinstance(context, dict) else context.to_dict()
+                         for key, context in self.__contexts.items()},
+            "resource_index": [[resource_type, resource_path, context_id]
+                               for (resource_type, resource_path), context_id in self.__resource_index.items()],
+            "recursive_resources": [[resource_type, resource_path]
+                                    for resource_type, resource_path in sorted(self.__recursive_resources)],
+            "journal_seq": self.__journal_seq
         }
 
+    def __record(self, mutation: dict):
+        # Mutations re-applied from the journal are already persisted
+        if not self.__replaying:
+            self.__mutations.append(mutation)
+
+    def get_journal_seq(self) -> int:
+        return self.__journal_seq
+
+    def drain_mutations(self) -> list:
+        """
+        Hand over the mutations recorded since the last drain, numbered after the current journal sequence
+        :return: the mutation records, in the order they were applied
+        """
+        mutations = [mutation for mutation in self.__mutations if mutation is not None]
+        for mutation in mutations:
+            self.__journal_seq += 1
+            mutation["seq"] = self.__journal_seq
+        self.__mutations = []
+        self.__pending_removals = dict()
+        return mutations
+
+    def apply_mutation(self, mutation: dict):
+        """
+        Re-apply a mutation record read back from the project journal
+        :param mutation: the mutation record
+        """
+        self.__replaying = True
+        try:
+            op = mutation["op"]
+            if op == "user_added":
+                self.add_new_user(mutation["user"])
+            elif op == "user_removed":
+                self.del_user(mutation["user"])
+            elif op == "context_created":
+                self.add_context(from_dict(mutation["context"]))
+            elif op == "context_deleted":
+                self.del_context(mutation["context_id"])
+            elif op == "resource_added":
+                resource_type, resource = mutation["resource"]
+                self.add_resource(mutation["context_id"], resource=resource, resource_type=resource_type)
+            elif op == "resource_removed":
+                resource_type, resource = mutation["resource"]
+                self.remove_resource(mutation["context_id"], resource=resource, resource_type=resource_type)
+            elif op == "resource_moved":
+                # Wherever the resource is held at this point of the replay, it ends up in the target context
+                resource_type, resource = mutation["resource"]
+                holder_id = self.__resource_index.get((resource_type, resource))
+                if holder_id is not None:
+                    self.remove_resource(holder_id, resource=resource, resource_type=resource_type)
+                self.add_resource(mutation["context_id"], resource=resource, resource_type=resource_type)
+            elif op == "resource_recursive":
+                resource_type, resource = mutation["resource"]
+                self.set_recursive(resource=resource, resource_type=resource_type, recursive=mutation["recursive"])
+            else:
+                raise ValueError(f"Unknown journal operation '{op}'")
+        finally:
+            self.__replaying = False
+        self.__journal_seq = mutation["seq"]
+
     def get_project_id(self) -> str:
         return self.__project_id
 
@@ -80,20 +185,167 @@ class Network:
 
     def add_new_user(self, user: str):
         # Update the set of involved users
-        self.__all_usernames.add(user)
+        if user not in self.__all_usernames:
+            self.__all_usernames.add(user)
+            self.__record({"op": "user_added", "user": user})
+
+    def del_user(self, user: str):
+        # Update the set of involved users
+        self.__all_usernames.remove(user)
+        self.__record({"op": "user_removed", "user": user})
+
+    def users_to_mask(self, user_ids: set[str]) -> int:
+        """
+        Encode a set of uids as a bitmask over the project's user-ordinal table
+        :param user_ids: uids (as strings) to encode, unseen uids are assigned the next ordinal
+        :return: the membership bitmask
+        """
+        mask = 0
+        for user_id in user_ids:
+            ordinal = self.__user_ordinals.get(user_id)
+            if ordinal is None:
+                ordinal = len(self.__ordinal_users)
+                self.__user_ordinals[user_id] = ordinal
+                self.__ordinal_users.append(user_id)
+            mask |= 1 << ordinal
+        return mask
+
+    def mask_to_users(self, mask: int) -> set[str]:
+        """
+        Decode a membership bitmask back into the set of uids
+        :param mask: the membership bitmask
+        :return: uids (as strings) whose bits are set
+        """
+        user_ids = set()
+        while mask:
+            lowest_bit = mask & -mask
+            user_ids.add(self.__ordinal_users[lowest_bit.bit_length() - 1])
+            mask ^= lowest_bit
+        return user_ids
+
+    def get_context_masks(self) -> dict[str, int]:
+        """
+        :return: a copy of context id -> membership bitmask, for every context
+        """
+        return dict(self.__context_masks)
+
+    def get_placements(self) -> dict[Tuple[int, str], str]:
+        """
+        :return: a copy of the resource index, (resource_type, resource) -> id of the context holding it
+        """
+        return dict(self.__resource_index)
 
     def add_context(self, context: Context):
 
         if context.get_id() not in self.__contexts.keys():
             self.__contexts[context.get_id()] = context
+            self.__context_masks[context.get_id()] = self.users_to_mask(context.get_users())
+            for resource in context.get_resources():
+                self.__resource_index[resource] = context.get_id()
+            self.__record({"op": "context_created", "context": context.to_dict()})
+
+    def __context_users(self, context_id: str) -> set[str]:
+        # Members of a context without materializing it
+        context = self.__contexts[context_id]
+        if isinstance(context, dict):
+            return set(str(to_uid(user_id)) for user_id in context["user_ids"])
+        return context.get_users()
+
+    def __context_resources(self, context_id: str) -> set[Tuple[int, str]]:
+        # Resources of a context without materializing it
+        context = self.__contexts[context_id]
+        if isinstance(context, dict):
+            return set(tuple(item) for item in context["resource_ids"])
+        return context.get_resources()
+
+    def get_context(self, context_id: str) -> Context:
+        """
+        Obtain a context, materializing it from its raw record on first access
+        :param context_id: the context identifier
+        :return: the Context
+        """
+        context = self.__contexts[context_id]
+        if isinstance(context, dict):
+            context = from_dict(context)
+            self.__contexts[context_id] = context
+        return context
 
     def get_contexts(self) -> dict[str, Context]:
+        for context_id in self.__contexts.keys():
+            self.get_context(context_id)
         return self.__contexts
 
     def del_context(self, context_id: str):
 
+        # Drop the index entries of the resources still held by the context
+        for resource in self.__context_resources(context_id):
+            if self.__resource_index.get(resource) == context_id:
+                del self.__resource_index[resource]
+
         # Delete the context
         del self.__contexts[context_id]
+        del self.__context_masks[context_id]
+        self.__record({"op": "context_deleted", "context_id": context_id})
+
+    def add_resource(self, context_id: str, resource: str, resource_type: int):
+
+        # Place the resource within the context and keep the index in sync
+        self.get_context(context_id).add_resource(resource=resource, resource_type=resource_type)
+        self.__resource_index[(resource_type, resource)] = context_id
+
+        # A removal followed by an addition of the same resource is journaled as a single move
+        removal = self.__pending_removals.pop((resource_type, resource), None)
+        if removal is not None:
+            self.__mutations[removal] = None
+            self.__record({"op": "resource_moved", "resource": [resource_type, resource], "context_id": context_id})
+        else:
+            self.__record({"op": "resource_added", "resource": [resource_type, resource], "context_id": context_id})
+
+    def remove_resource(self, context_id: str, resource: str, resource_type: int):
+
+        # Take the resource out of the context and keep the index in sync
+        self.get_context(context_id).remove_resource(resource=resource, resource_type=resource_type)
+        if self.__resource_index.get((resource_type, resource)) == context_id:
+            del self.__resource_index[(resource_type, resource)]
+
+        if not self.__replaying:
+            self.__pending_removals[(resource_type, resource)] = len(self.__mutations)
+        self.__record({"op": "resource_removed", "resource": [resource_type, resource], "context_id": context_id})
+
+    def is_recursive(self, resource: str, resource_type: int) -> bool:
+        """
+        :param resource: the resource identifier (absolute path or partition name)
+        :param resource_type: type of the resource (1:file/directory, 2:computational partition)
+        :return: True if the privileges of the resource apply to everything below it
+        """
+        return (resource_type, resource) in self.__recursive_resources
+
+    def set_recursive(self, resource: str, resource_type: int, recursive: bool):
+        """
+        Record whether the privileges of a resource are propagated to everything below it
+        :param resource: the resource identifier (absolute path)
+        :param resource_type: type of the resource
+        :param recursive: the new marker
+        """
+        if ((resource_type, resource) in self.__recursive_resources) == recursive:
+            return
+        if recursive:
+            self.__recursive_resources.add((resource_type, resource))
+        else:
+            self.__recursive_resources.discard((resource_type, resource))
+        self.__record({"op": "resource_recursive", "resource": [resource_type, resource], "recursive": recursive})
+
+    def get_resource_context(self, resource: str, resource_type: int):
+        """
+        Find the context currently holding a resource
+        :param resource: the resource identifier (absolute path or partition name)
+        :param resource_type: type of the resource (1:file/directory, 2:computational partition)
+        :return: the holding Context, or None if the resource is not shared
+        """
+        context_id = self.__resource_index.get((resource_type, resource))
+        if context_id is None:
+            return None
+        return self.get_context(context_id)
 
     def share_resource(self, from_user_id: str, resource_id_to_share: str, to_user_ids: set[str], resource_type: int) \
             -> (str, set[str]):
@@ -102,25 +354,19 @@ class Network:
         involved_users = to_user_ids.union({from_user_id})
 
         # The purpose is to find whether the resource is already shared within some context
-        already_shared_context = None
-
-        for context_id, context in self.__contexts.items():
-            resources = context.get_resources()
-
-            # If resource is already shared within the current context
-            # Keep a note of the context and remove the resource to elevate later
-            # No further search is needed because one resource can be shared at most one context
-            if (resource_type, resource_id_to_share) in resources:
-                already_shared_context = context
-                context.remove_resource(resource_type=resource_type, resource=resource_id_to_share)
-                break
+        # One resource can be shared within at most one context, so the index answers it directly
+        # Keep a note of the context and remove the resource to elevate later
+        already_shared_context = self.get_resource_context(resource=resource_id_to_share, resource_type=resource_type)
+        if already_shared_context is not None:
+            self.remove_resource(already_shared_context.get_id(), resource=resource_id_to_share,
+                                 resource_type=resource_type)
 
         # If the resource is already not shared
         # The context to share is the one with all involved users
         if already_shared_context is None:
             correct_context_id = ''.join(sorted(involved_users))
             if correct_context_id in self.__contexts.keys():
-                correct_context = self.__contexts[correct_context_id]
+                correct_context = self.get_context(correct_context_id)
             else:
                 correct_context = Context(user_ids=involved_users)
                 self.add_context(correct_context)
@@ -130,16 +376,16 @@ class Network:
         # The context to share is the union on that context and the one with all involved users
         # Privilege Elevation to Super-Collaboration
         else:
-            already_shared_users = already_shared_context.get_users()
-            correct_users = involved_users.union(already_shared_users)
+            correct_users = self.mask_to_users(
+                self.users_to_mask(involved_users) | self.__context_masks[already_shared_context.get_id()])
             correct_context_id = ''.join(sorted(correct_users))
             if correct_context_id in self.__contexts.keys():
-                correct_context = self.__contexts[correct_context_id]
+                correct_context = self.get_context(correct_context_id)
             else:
                 correct_context = Context(correct_users)
                 self.add_context(correct_context)
 
-        correct_context.add_resource(resource=resource_id_to_share, resource_type=resource_type)
+        self.add_resource(correct_context.get_id(), resource=resource_id_to_share, resource_type=resource_type)
 
         if already_shared_context is None:
             return None, correct_users
@@ -151,128 +397,135 @@ class Network:
         # Get all users who are involved in the transaction
         involved_users = to_user_ids.union({from_user_id})
 
-        correct_users = set()
-        already_shared_context = None
-
-        for context_id, context in self.get_contexts().items():
-
-            users = context.get_users()
-            resources = context.get_resources()
-
-            # Only investigate a context if it includes all involved users
-            if involved_users.issubset(users):
-
-                # If the context has the shared resources
-                # Remove the resource from the current context to the child without
-                if (resource_type, resource_id_to_unshare) in resources:
+        # Locate the only context that can hold the resource
+        already_shared_context = self.get_resource_context(resource=resource_id_to_unshare,
+                                                           resource_type=resource_type)
+        if already_shared_context is None:
+            return None, None
 
-                    context.remove_resource(resource=resource_id_to_unshare, resource_type=resource_type)
-                    already_shared_context = context
+        # Only investigate the context if it includes all involved users
+        involved_mask = self.users_to_mask(involved_users)
+        context_mask = self.__context_masks[already_shared_context.get_id()]
+        if context_mask & involved_mask != involved_mask:
+            return None, None
 
-                    additional_users = users.difference(involved_users)
-                    # If the context to unshare is a leaf node (U2U Collaboration), then nothing else to do
-                    if len(additional_users) == 0:
-                        return already_shared_context.get_users(), None
+        # Remove the resource from the current context to the child without
+        self.remove_resource(already_shared_context.get_id(), resource=resource_id_to_unshare,
+                             resource_type=resource_type)
 
-                    correct_users = additional_users.union({from_user_id})
+        additional_mask = context_mask & ~involved_mask
+        # If the context to unshare is a leaf node (U2U Collaboration), then nothing else to do
+        if additional_mask == 0:
+            return already_shared_context.get_users(), None
 
-        if already_shared_context is None:
-            return None, None
+        correct_users = self.mask_to_users(additional_mask | self.users_to_mask({from_user_id}))
 
         correct_context_id = ''.join(sorted(correct_users))
 
         if correct_context_id in self.__contexts.keys():
-            correct_context = self.__contexts[correct_context_id]
+            correct_context = self.get_context(correct_context_id)
         else:
             correct_context = Context(correct_users)
             self.add_context(correct_context)
-        correct_context.add_resource(resource=resource_id_to_unshare, resource_type=resource_type)
+        self.add_resource(correct_context.get_id(), resource=resource_id_to_unshare, resource_type=resource_type)
         return already_shared_context.get_users(), correct_users
 
+    @staticmethod
+    def __get_resource_owner(resource: str, resource_type: int):
+        # uid (as a string) of the owner of a resource, None if it cannot be determined
+
+        # File/Directory
+        if resource_type == 1:
+            try:
+                return str(os.lstat(resource).st_uid)
+            except (FileNotFoundError, NotADirectoryError):
+                # Deleted since it was shared: owned by nobody, it is un-shared
+                return None
+
+        # Computational Partition
+        elif resource_type == 2:
+            # Answered from the partitions fetched once per command
+            owner_name = get_slurm_partitions().get_owner(resource)
+            if owner_name is not None:
+                return str(uid_of(owner_name))
+
+        return None
+
     def remove_user(self, user_id: str):
+        """
+        Remove a user from the network, contracting the privileges of every context the user belongs to
+        :param user_id: uid (as a string) of the user to remove
+        :return: (privileges_to_update, contexts_to_delete) as returned by remove_users
+        """
+        return self.remove_users({user_id})
+
+    def remove_users(self, user_ids: set[str]):
+        """
+        Remove several users at once, in a single scan of the network
+        The outcome is the one of removing each user in turn, but every affected resource is placed directly in its
+        final context and no intermediate context is created
+        :param user_ids: uids (as strings) of the users to remove
+        :return: (privileges_to_update, contexts_to_delete): resource -> {resource_type, already_shared_users,
+        correct_users}, and the user sets of the removed contexts that held no resource, relative to the network
+        before the removal
+        """
 
         # Maintain a dict of information to further update privileges
         privileges_to_update = dict()
         contexts_to_delete = []
 
-        # Remove the user from the network object, and remove the project from the user
-        username = pwd.getpwuid(int(user_id)).pw_name
-        self.__all_usernames.remove(username)
+        # Remove the users from the network object, and remove the project from the users
+        for user_id in user_ids:
+            self.del_user(username_of(user_id))
+
+        removed_mask = self.users_to_mask(user_ids)
+
+        # Step 1: Only the contexts including one of the users need to be investigated, and they all need to be removed
+        affected_context_ids = [context_id for context_id, context_mask in self.__context_masks.items()
+                                if context_mask & removed_mask]
 
-        for context_id, context in self.__contexts.copy().items():
-            current_context = context
+        for context_id in affected_context_ids:
+            current_context = self.get_context(context_id)
 
             current_context_users = current_context.get_users()
             current_context_resources = current_context.get_resources().copy()
 
-            # Step 1: Check if the user exists in the current context, then it needs to be removed
-            if user_id in current_context_users:
-                
-                # Step 1.1: If no resources are shared within that context it needs to be removed
-                if len(current_context_resources) == 0:
-                    contexts_to_delete.append(current_context_users)
-                    
-                # Step 2: Check if the current context is a leaf context (i.e. U2U collaboration), delete it!
-                if len(current_context.get_users()) == 2:
-
-                    for resource_type, resource_path in current_context_resources:
-                        privileges_to_update[resource_path] = dict({
-                            "resource_type": resource_type,
-                            "already_shared_users": current_context_users,
-                            "correct_users": None
-                        })
-
-                else:
-                    for resource_type, resource_path in current_context_resources:
-
-                        owner_uid = -1
-
-                        # File/Directory
-                        if resource_type == 1:
-                            resource_metadata = os.stat(resource_path)
-                            owner_uid = str(resource_metadata.st_uid)
-
-                        # Computational Partition
-                        elif resource_type == 2:
-                            # Run the scontrol show partition command and capture the output
-                            result = subprocess.run(['scontrol', 'show', 'partition'], stdout=subprocess.PIPE,
-                                                    text=True)
-                            output = result.stdout.splitlines()
-
-                            for line in output:
-                                if line.startswith('PartitionName='):
-                                    partition_name = line.split("=")[1]
-                                    if partition_name == resource_path:
-                                        owner_name = resource_path.split("_")[0]
-                                        owner_uid = pwd.getpwnam(owner_name).pw_uid
-
-                        # Step 3: Check if the user have been shared anything within the context, then un-share it
-                        # and re-share it with some lower context
-                        if owner_uid != user_id:
-                            already_shared_users, correct_users = self.unshare_resource(
-                                from_user_id=owner_uid,
-                                resource_id_to_unshare=resource_path,
-                                to_user_ids={user_id},
-                                resource_type=resource_type
-                            )
-
-                            privileges_to_update[resource_path] = dict({
-                                "resource_type": resource_type,
-                                "already_shared_users": already_shared_users,
-                                "correct_users": correct_users
-                            })
-
-                        # Step 4: Check if the user has shared anything within the context, then un-share it
-                        else:
-                            privileges_to_update[resource_path] = dict({
-                                "resource_type": resource_type,
-                                "already_shared_users": current_context_users,
-                                "correct_users": None
-                            })
-
-                # Delete the context from the network
-                self.del_context(context_id)
-                # self.print_network()
+            # Step 1.1: If no resources are shared within that context it needs to be removed
+            if len(current_context_resources) == 0:
+                contexts_to_delete.append(current_context_users)
+
+            # Step 2: The users left once all the removed users are gone
+            remaining_mask = self.__context_masks[context_id] & ~removed_mask
+            remaining_users = self.mask_to_users(remaining_mask) if bin(remaining_mask).count("1") >= 2 else None
+
+            for resource_type, resource_path in current_context_resources:
+
+                # Step 3: A resource stays shared with the remaining users if they still form a collaboration and
+                # its owner is one of them, otherwise it is un-shared
+                correct_users = None
+                if remaining_users is not None:
+                    owner_uid = self.__get_resource_owner(resource_path, resource_type)
+                    if owner_uid in remaining_users:
+                        correct_users = remaining_users
+
+                privileges_to_update[resource_path] = dict({
+                    "resource_type": resource_type,
+                    "already_shared_users": current_context_users,
+                    "correct_users": correct_users
+                })
+
+                if correct_users is None:
+                    continue
+
+                # Step 4: Move the resource straight to its final context
+                self.remove_resource(context_id, resource=resource_path, resource_type=resource_type)
+                correct_context_id = ''.join(sorted(correct_users))
+                if correct_context_id not in self.__contexts.keys():
+                    self.add_context(Context(correct_users))
+                self.add_resource(correct_context_id, resource=resource_path, resource_type=resource_type)
+
+            # Delete the context from the network
+            self.del_context(context_id)
 
         return privileges_to_update, contexts_to_delete
 
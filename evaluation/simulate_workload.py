@@ -3,19 +3,20 @@ import subprocess
 import time
 import pandas as pd
 from collections import defaultdict
-import json
+from utilities.project_store import ProjectStore
 
 # random.seed(5)
 
+# Read-only: the project is reparsed only when a tick wrote to it
+project_store = ProjectStore(writer=None)
+
 # Counts the active context
 def count_active_contexts(json_path):
-    with open(json_path, 'r') as f:
-        data = json.load(f)
+    # The snapshot (JSON or binary) with its journal replayed, as CLEARS itself sees the project
+    network = project_store.load(json_path)
 
-    active_count = sum(
-        1 for context in data.get("contexts", {}).values()
-        if context.get("resource_ids") and len(context["resource_ids"]) > 0
-    )
+    # A context is active while it holds at least one resource
+    active_count = len(set(network.get_placements().values()))
 
     return active_count
 
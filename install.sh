@@ -28,7 +28,9 @@ sudo chown -R root "$APP_DIR"
 
 echo "[6/9] Compiling C wrappers..."
 gcc utilities/wrapper_network_dump.c -o wrapper_network_dump
-gcc utilities/wrapper_supdate.c -o wrapper_supdate
+# wrapper_supdate execs scontrol by absolute path
+SCONTROL_PATH="$(command -v scontrol || echo /usr/bin/scontrol)"
+gcc -DSCONTROL_PATH="\"$SCONTROL_PATH\"" utilities/wrapper_supdate.c -o wrapper_supdate
 sudo mv wrapper_network_dump wrapper_supdate "$APP_DIR/utilities/"
 
 echo "[7/9] Updating permissions for privileged wrappers..."
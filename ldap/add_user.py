@@ -1,5 +1,33 @@
-from ldap3 import MODIFY_ADD
+from ldap3 import BASE, MODIFY_ADD
 
 
 def add_user_to_group(conn, group_dn, user_uid):
     conn.modify(group_dn, {'memberUid': [(MODIFY_ADD, [user_uid])]})
+
+
+def add_users_to_group(conn, group_dn, user_uids):
+    """
+    Add many members to a group with a single modify
+    :param conn: a bound LDAP connection
+    :param group_dn: DN of the posixGroup
+    :param user_uids: usernames to add as memberUid values
+    :return: True if every user is a member afterwards
+    """
+    user_uids = sorted(set(user_uids))
+    if not user_uids:
+        return True
+
+    if conn.modify(group_dn, {'memberUid': [(MODIFY_ADD, user_uids)]}):
+        return True
+
+    # The whole modify is rejected if any value is already present (attributeOrValueExists):
+    # read the current members once and add only the missing ones
+    conn.search(group_dn, '(objectClass=posixGroup)', search_scope=BASE, attributes=['memberUid'])
+    existing = set(conn.entries[0].memberUid.values) if conn.entries else set()
+    missing = [user_uid for user_uid in user_uids if user_uid not in existing]
+    if not missing or conn.modify(group_dn, {'memberUid': [(MODIFY_ADD, missing)]}):
+        return True
+
+    print(f"Failed to add {user_uids} to {group_dn}")
+    print(f"Result: {conn.result}")
+    return False
@@ -1,5 +1,10 @@
+import atexit
+import threading
+
 from ldap3 import Server, Connection
 
+from ldap.pool import LDAPConnectionPool
+
 
 def connect_to_ldap(
         server_url="",  # Add your LDAP server URL here
@@ -10,3 +15,19 @@ def connect_to_ldap(
     conn = Connection(server, user=username, password=password)
     conn.bind()
     return conn
+
+
+# The process-wide pool of admin connections, created on first use
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_ldap_pool() -> LDAPConnectionPool:
+    global _pool
+    # The threads of the daemon share a single pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = LDAPConnectionPool(factory=connect_to_ldap)
+            # Unbind politely when the process exits
+            atexit.register(_pool.close)
+    return _pool
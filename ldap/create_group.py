@@ -1,5 +1,17 @@
-from ldap3 import MODIFY_ADD
+from ldap3 import BASE
 
 
-def create_group(conn, group_dn, group_name, gid_number):
-    return conn.add(group_dn, ['top', 'posixGroup'], {'cn': group_name, 'gidNumber': gid_number})
+def create_group(conn, group_dn, group_name, gid_number, member_uids=None):
+    # The initial members are part of the same add, so a new collaboration costs a single round trip
+    attributes = {'cn': group_name, 'gidNumber': gid_number}
+    if member_uids:
+        attributes['memberUid'] = sorted(set(member_uids))
+    return conn.add(group_dn, ['top', 'posixGroup'], attributes)
+
+
+def get_group_gid(conn, group_dn):
+    # The gidNumber of an existing group, or None if there is no such group
+    if not conn.search(group_dn, '(objectClass=posixGroup)', search_scope=BASE, attributes=['gidNumber']) \
+            or not conn.entries:
+        return None
+    return int(conn.entries[0].gidNumber.value)
@@ -7,3 +7,5 @@ def delete_group(conn, group_dn):
         print(f"Failed to remove group {group_dn}")
         print(f"Result: {conn.result}")
         print(f"Response: {conn.response}")
+
+    return success
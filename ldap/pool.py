@@ -0,0 +1,147 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from ldap3.core.exceptions import LDAPCommunicationError, LDAPException
+
+
+class LDAPConnectionPool:
+    """
+    A bounded pool of bound LDAP connections, so that long-lived or batch processes reuse them instead of paying a
+    TCP connect and a bind per operation
+    Connections are created by a factory returning a bound ldap3 Connection (e.g. connect_to_ldap, or a
+    MOCK_SYNC connection in tests)
+    """
+
+    def __init__(self, factory, max_size=4, max_idle=300, acquire_timeout=30):
+        """
+        :param factory: callable returning a new bound Connection
+        :param max_size: maximum number of connections open at once
+        :param max_idle: seconds after which an idle connection is re-bound before reuse (servers drop idle ones)
+        :param acquire_timeout: seconds to wait for a free connection when the pool is exhausted
+        """
+        self.__factory = factory
+        self.__max_size = max_size
+        self.__max_idle = max_idle
+        self.__acquire_timeout = acquire_timeout
+
+        self.__idle: list = []  # (connection, released_at)
+        self.__size = 0
+        self.__closed = False
+        self.__condition = threading.Condition()
+
+    def __is_healthy(self, conn, released_at) -> bool:
+        # A connection is reusable if it is still open and bound, long idle ones are re-bound first
+        try:
+            if conn.closed or not conn.bound or time.monotonic() - released_at > self.__max_idle:
+                return conn.rebind()
+            return True
+        except LDAPException:
+            return False
+
+    def __discard(self, conn):
+        try:
+            conn.unbind()
+        except LDAPException:
+            pass
+
+    def acquire(self):
+        """
+        Take a healthy bound connection out of the pool, opening a new one if none is idle
+        Prefer connection(), which also drops a connection that failed with a communication error
+        :return: a bound Connection, to be handed back with release()
+        """
+        deadline = time.monotonic() + self.__acquire_timeout
+
+        while True:
+            conn = None
+            with self.__condition:
+                while True:
+                    if self.__closed:
+                        raise RuntimeError("LDAP connection pool is closed")
+
+                    if self.__idle:
+                        conn, released_at = self.__idle.pop()
+                        break
+
+                    if self.__size < self.__max_size:
+                        self.__size += 1
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self.__condition.wait(remaining):
+                        raise TimeoutError("Timed out waiting for a free LDAP connection")
+
+            if conn is None:
+                break
+
+            # The health check may re-bind, a network round trip: made outside the lock, the connection is already
+            # taken out of the pool
+            if self.__is_healthy(conn, released_at):
+                return conn
+
+            # Replace the broken connection
+            self.__discard(conn)
+            with self.__condition:
+                self.__size -= 1
+                self.__condition.notify()
+
+        # Open the connection outside the lock, the bind is a network round trip
+        try:
+            conn = self.__factory()
+            if not conn.bound:
+                raise LDAPException(f"LDAP bind failed: {conn.result}")
+            return conn
+        except Exception:
+            with self.__condition:
+                self.__size -= 1
+                self.__condition.notify()
+            raise
+
+    def release(self, conn, discard=False):
+        """
+        Hand a connection back to the pool
+        :param conn: the connection obtained from acquire()
+        :param discard: drop the connection instead of reusing it (e.g. after a communication error)
+        """
+        with self.__condition:
+            discard = discard or self.__closed or conn.closed
+            if discard:
+                self.__size -= 1
+            else:
+                self.__idle.append((conn, time.monotonic()))
+            self.__condition.notify()
+        # Unbinding is a network round trip, made outside the lock
+        if discard:
+            self.__discard(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of a with-block
+        A connection that failed with a communication error is dropped rather than returned to the pool
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        except LDAPCommunicationError:
+            self.release(conn, discard=True)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        """
+        Unbind every idle connection and refuse further acquisitions
+        Connections still borrowed are unbound when they are released
+        """
+        with self.__condition:
+            self.__closed = True
+            for conn, _ in self.__idle:
+                self.__discard(conn)
+                self.__size -= 1
+            self.__idle = []
+            self.__condition.notify_all()
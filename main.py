@@ -2,7 +2,7 @@
 
 import os
 import sys
-from utilities.collab import create_project, add_collaborator, remove_collaborator, share, unshare, end_project
+from utilities.client import request_daemon, resolve_resources
 import subprocess
 import argparse
 
@@ -34,20 +34,51 @@ def print_help():
     print("\n\tunshare\tRetract previously shared privileges from a collaborator within a project.")
     print("\n\tremove\tRemove collaborators from an existing project. (requires administrative privileges to perform)")
     print("\n\tend\tEnd an existing project. (requires administrative privileges to perform)")
+    print("\n\tbatch\tApply a JSONL stream of operations (-f file, stdin by default), one JSON result per line.")
+    print("\n\tdaemon\tRun the resident CLEARS daemon serving all commands. (requires administrative privileges to perform)")
     print("\n\thelp\tLaunch the help menu.")
 
 
+# Perform an action: through the resident daemon if it is running, in-process otherwise
+def run_action(action, project_id=None, users=None, resource=None, resource_type=None, owner=None,
+               recursive=False):
+    request = {
+        "action": action,
+        "project": project_id,
+        "users": sorted(users) if users else [],
+        "resource": resolve_resources(resource, resource_type),
+        "type": resource_type,
+        "owner": owner,
+        "recursive": recursive,
+    }
+
+    response = request_daemon(request)
+    if response is not None:
+        print(response["output"], end="")
+        return
+
+    # No daemon: pay the full start-up cost (ldap3, project parsing, ...) in this process
+    from utilities.daemon import execute_request
+    execute_request(request)
+
+
 def main():
     parser = argparse.ArgumentParser(description='Authorization Model CLI')
-    parser.add_argument('action', choices=["start", "add", "remove", "share", "unshare", "end", "help"],
+    parser.add_argument('action',
+                        choices=["start", "add", "remove", "share", "unshare", "end", "batch", "daemon", "help"],
                         help='Action to perform')
     parser.add_argument('--mode', choices=['interactive', 'non-interactive'], default='interactive',
                         help='Mode of operation')
     parser.add_argument('-p', '--project', help='Project ID')
     parser.add_argument('-o', '--owner', help='Owner / Command Initiator')
     parser.add_argument('-u', '--users', nargs='*', help='Usernames (space-separated list)')
-    parser.add_argument('-r', '--resource', help='Resource name to share/unshare')
+    parser.add_argument('-r', '--resource', nargs='+',
+                        help='Resource name(s) to share/unshare (files/directories may be glob patterns)')
+    parser.add_argument('-R', '--resource-file', help='File listing the resources to share/unshare, one per line')
     parser.add_argument('-t', '--type', type=int, choices=[1, 2], help='Resource type (1 for file, 2 for compute)')
+    parser.add_argument('--recursive', action='store_true',
+                        help='Share directories with everything below them (share only)')
+    parser.add_argument('-f', '--file', default='-', help='JSONL operations for batch (default: stdin)')
 
     args = parser.parse_args()
     action = args.action.lower()
@@ -56,6 +87,21 @@ def main():
         print_help()
         return
 
+    if action == "daemon":
+        from utilities.daemon import serve
+        serve()
+        return
+
+    if action == "batch":
+        # The whole batch runs in this process, every project is loaded and written once
+        from utilities.batch import run_batch
+        if args.file == '-':
+            succeeded = run_batch(sys.stdin)
+        else:
+            with open(args.file, 'r') as stream:
+                succeeded = run_batch(stream)
+        sys.exit(0 if succeeded else 1)
+
 
     if args.mode == "interactive":
         """
@@ -65,7 +111,7 @@ def main():
         if action == "start":
             if is_in_sudoers():
                 project_id = input("Enter the project name: ")
-                create_project(project_id=project_id)
+                run_action("start", project_id=project_id)
             else:
                 print("start project: This action can only be performed with Administrative Privileges.")
 
@@ -73,7 +119,7 @@ def main():
             if is_in_sudoers():
                 project_id = input("Enter the project name: ")
                 collaborators = input("Enter the user names to add (space separated): ").split()
-                add_collaborator(project_id, set(collaborators))
+                run_action("add", project_id=project_id, users=set(collaborators))
             else:
                 print("add collaborators: This action can only be performed with Administrative Privileges.")
 
@@ -81,7 +127,7 @@ def main():
             if is_in_sudoers():
                 project_id = input("Enter the project name: ")
                 collaborators = input("Enter the user names to remove (space separated): ").split()
-                remove_collaborator(project_id, set(collaborators))
+                run_action("remove", project_id=project_id, users=set(collaborators))
             else:
                 print("remove collaborators: This action can only be performed with Administrative Privileges.")
 
@@ -89,24 +135,27 @@ def main():
             from_user = os.getlogin()
             project_id = input("Enter the project name: ")
             resource_type = int(input("Enter the resource type (1=file, 2=compute): "))
-            resource_name = input("Enter the resource name: ")
+            resource_name = input("Enter the resource name (or a glob pattern): ")
             users = input("Enter usernames to share with: ").split()
-            share(from_username=from_user, resource_id_to_share=resource_name, to_usernames=set(users),
-                  project_id=project_id, resource_type=resource_type)
+            recursive = args.recursive
+            if resource_type == 1 and not recursive:
+                recursive = input("Share everything below directories too? (y/N): ").strip().lower() == "y"
+            run_action("share", project_id=project_id, users=set(users), resource=resource_name,
+                       resource_type=resource_type, owner=from_user, recursive=recursive)
 
         elif action == "unshare":
             from_user = os.getlogin()
             project_id = input("Enter the project name: ")
             resource_type = int(input("Enter the resource type (1=file, 2=compute): "))
-            resource_name = input("Enter the resource name: ")
+            resource_name = input("Enter the resource name (or a glob pattern): ")
             users = input("Enter usernames to unshare with: ").split()
-            unshare(from_username=from_user, resource_id_to_unshare=resource_name, to_usernames=set(users),
-                    project_id=project_id, resource_type=resource_type)
+            run_action("unshare", project_id=project_id, users=set(users), resource=resource_name,
+                       resource_type=resource_type, owner=from_user)
 
         elif action == "end":
             if is_in_sudoers():
                 project_id = input("Enter the project name: ")
-                end_project(project_id=project_id)
+                run_action("end", project_id=project_id)
             else:
                 print("end project: This action can only be performed with Administrative Privileges.")
 
@@ -117,7 +166,10 @@ def main():
         """
         project_id = args.project
         users = set(args.users) if args.users else set()
-        resource = args.resource
+        resource = list(args.resource) if args.resource else []
+        if args.resource_file:
+            with open(args.resource_file, 'r') as resource_file:
+                resource.extend(line.strip() for line in resource_file if line.strip())
         resource_type = args.type
         from_user = args.owner
 
@@ -125,20 +177,8 @@ def main():
         #     print(f"{action} requires administrative privileges.")
         #     return
 
-        if action == "start":
-            create_project(project_id=project_id)
-        elif action == "add":
-            add_collaborator(project_id, users)
-        elif action == "remove":
-            remove_collaborator(project_id, users)
-        elif action == "end":
-            end_project(project_id=project_id)
-        elif action == "share":
-            share(from_username=from_user, resource_id_to_share=resource,
-                  to_usernames=users, project_id=project_id, resource_type=resource_type)
-        elif action == "unshare":
-            unshare(from_username=from_user, resource_id_to_unshare=resource,
-                    to_usernames=users, project_id=project_id, resource_type=resource_type)
+        run_action(action, project_id=project_id, users=users, resource=resource,
+                   resource_type=resource_type, owner=from_user, recursive=args.recursive)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,76 @@
+import io
+import os
+import tempfile
+import threading
+import unittest
+
+from utilities.daemon import RequestOutput
+from utilities.project_lock import ProjectLocks
+
+
+def write_file(path, content, append=False):
+    with open(path, "ab" if append else "wb") as file:
+        file.write(content)
+    return True
+
+
+class TestConcurrentRequests(unittest.TestCase):
+
+    def test_each_request_captures_its_own_output(self):
+        stream = io.StringIO()
+        stdout = RequestOutput(stream)
+        barrier = threading.Barrier(2)
+        outputs = [io.StringIO(), io.StringIO()]
+
+        def serve(index):
+            with stdout.capturing(outputs[index]):
+                for line in range(3):
+                    # Both requests print at the same time
+                    barrier.wait()
+                    print(f"request {index} line {line}", file=stdout)
+
+        threads = [threading.Thread(target=serve, args=(index,)) for index in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print("outside of any request", file=stdout)
+
+        for index in range(2):
+            self.assertEqual(outputs[index].getvalue(), "".join(f"request {index} line {line}\n" for line in range(3)))
+        self.assertEqual(stream.getvalue(), "outside of any request\n")
+
+    def test_threads_queue_on_the_same_project_only(self):
+        with tempfile.TemporaryDirectory() as directory:
+            project_locks = ProjectLocks(writer=write_file)
+            first, second = os.path.join(directory, "P1.json"), os.path.join(directory, "P2.json")
+            project_locks.acquire(first, create=True)
+            # Re-entrant within the thread
+            project_locks.acquire(first)
+            project_locks.release(first)
+
+            acquired = {}
+
+            def acquire(project_file):
+                project_locks.acquire(project_file, create=True)
+                acquired[project_file] = True
+                project_locks.release(project_file)
+
+            other_project = threading.Thread(target=acquire, args=(second,))
+            other_project.start()
+            other_project.join(timeout=5)
+            self.assertTrue(acquired.get(second))
+
+            same_project = threading.Thread(target=acquire, args=(first,))
+            same_project.start()
+            same_project.join(timeout=0.5)
+            self.assertFalse(acquired.get(first))
+            self.assertFalse(project_locks.is_held(second))
+
+            project_locks.release(first)
+            same_project.join(timeout=5)
+            self.assertTrue(acquired.get(first))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+
+from classes.collab import Network
+
+
+@unittest.skipUnless(os.getuid() == 0, "the shared files must be owned by a collaborator (root)")
+class TestRemoveUsers(unittest.TestCase):
+    # System accounts stand in for collaborators: root (0), daemon (1), bin (2), sys (3)
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.network = Network({"root", "daemon", "bin", "sys"}, "P")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def share(self, name: str) -> str:
+        path = os.path.join(self.directory.name, name)
+        open(path, "w").close()
+        self.network.share_resource(str(os.getuid()), path, {"1", "2"}, 1)
+        return path
+
+    def test_resource_moves_to_the_remaining_collaboration(self):
+        path = self.share("kept")
+        privileges_to_update, _ = self.network.remove_users({"2"})
+        self.assertEqual(privileges_to_update[path]["correct_users"], {"0", "1"})
+        self.assertEqual(self.network.get_placements()[(1, path)], "01")
+
+    def test_deleted_resource_is_unshared(self):
+        # A file deleted since it was shared has no owner left among the remaining collaborators
+        path = self.share("deleted")
+        os.unlink(path)
+        privileges_to_update, _ = self.network.remove_users({"2"})
+        self.assertIsNone(privileges_to_update[path]["correct_users"])
+        self.assertNotIn((1, path), self.network.get_placements())
+
+
+if __name__ == "__main__":
+    unittest.main()
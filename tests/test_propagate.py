@@ -0,0 +1,45 @@
+import os
+import subprocess
+import tempfile
+import unittest
+
+from utilities.propagate import propagate_tree
+
+
+class TestTreePropagation(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        for sub in ["a", "a/b", "c"]:
+            os.makedirs(os.path.join(self.root, sub))
+        for name in ["f1", "a/f2", "a/b/f3", "c/f4"]:
+            open(os.path.join(self.root, name), "w").close()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_updates_every_owned_entry(self):
+        updated = propagate_tree(self.root, lambda fd, is_directory: None, owner_uid=os.getuid(), workers=4)
+        self.assertEqual(updated, 7)
+
+    def test_failing_apply_is_counted_and_the_walk_completes(self):
+        # Failures other than OSError (e.g. a failed nfs4_setfacl) must not kill the workers
+        def apply(fd, is_directory):
+            if not is_directory:
+                raise subprocess.CalledProcessError(1, "nfs4_setfacl")
+
+        updated = propagate_tree(self.root, apply, owner_uid=os.getuid(), workers=2)
+        self.assertEqual(updated, 3)
+
+    def test_failing_apply_on_directories_skips_their_subtrees(self):
+        def apply(fd, is_directory):
+            if is_directory:
+                raise ValueError("malformed ACL")
+
+        updated = propagate_tree(self.root, apply, owner_uid=os.getuid(), workers=2)
+        self.assertEqual(updated, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+
+import contextlib
+import io
+import json
+import os
+import sys
+import traceback
+
+from utilities.collab import batch_session
+from utilities.daemon import authorize_request, execute_request
+
+# The operations a batch may contain
+BATCH_ACTIONS = {"start", "add", "share", "unshare", "remove", "end"}
+
+
+def get_batch_projects(lines: list) -> tuple[set[str], set[str]]:
+    """
+    Find the project files a batch operates on, so they can all be locked before it starts
+    :param lines: the lines of the batch
+    :return: paths of the project files, and of those the batch creates
+    """
+    project_files = set()
+    created_files = set()
+    for line in lines:
+        try:
+            request = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(request, dict) and isinstance(request.get("project"), str) and request["project"]:
+            project_files.add(f"/etc/project/{request['project']}.json")
+            if request.get("action") == "start":
+                created_files.add(f"/etc/project/{request['project']}.json")
+    return project_files, created_files
+
+
+def run_batch(stream, out=sys.stdout) -> bool:
+    """
+    Apply a JSONL stream of operations in one process
+    Each project is loaded once and written once at the end, the LDAP connection is reused, and the ACL flushes and
+    Slurm updates are applied once for the whole batch
+    The projects of the batch are locked, in sorted order, for its whole duration
+    :param stream: one operation per line, e.g. {"action": "share", "project": "P1", "owner": "alice",
+                   "users": ["bob"], "resource": "/scratch/data", "type": 1}
+    :param out: where the per-operation results are written, one JSON record per line
+    :return: True if every operation succeeded
+    """
+    results = []
+
+    lines = [line.strip() for line in stream]
+
+    # What the final project writes print is not part of any operation's result
+    with contextlib.redirect_stdout(sys.stderr), batch_session(*get_batch_projects(lines)) as session:
+        for line_number, line in enumerate(lines, start=1):
+            if not line or line.startswith("#"):
+                continue
+
+            output = io.StringIO()
+            request = None
+            status = "ok"
+
+            with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        request = None
+                        raise ValueError("An operation must be a JSON object")
+                    if request.get("action") not in BATCH_ACTIONS:
+                        print(f"Unknown batch action '{request.get('action')}'")
+                        status = "error"
+                    # Each operation is authorized as the invoking user, as the daemon does for its clients
+                    elif not authorize_request(request, os.getuid()):
+                        status = "denied"
+                    elif not execute_request(request):
+                        status = "failed"
+                except Exception as e:
+                    status = "error"
+                    print(f"Exception type: {type(e).__name__}")
+                    traceback.print_exc()
+                    print(f"Error message: {str(e)}")
+
+                # Changes of an operation that did not complete are not written
+                if status != "ok" and request is not None and request.get("project"):
+                    try:
+                        session.rollback(f"/etc/project/{request['project']}.json")
+                    except Exception as e:
+                        print(f"Error: {e}")
+
+            results.append({
+                "line": line_number,
+                "action": request.get("action") if request else None,
+                "project": request.get("project") if request else None,
+                "status": status,
+                "output": output.getvalue(),
+            })
+
+    # An operation only succeeded once its project was written
+    failed_projects = session.get_failed_projects()
+    for result in results:
+        if result["status"] == "ok" and f"/etc/project/{result['project']}.json" in failed_projects:
+            result["status"] = "error"
+            result["output"] += "Failed to write the project file\n"
+        out.write(json.dumps(result) + "\n")
+
+    return all(result["status"] == "ok" for result in results)
@@ -0,0 +1,57 @@
+import glob
+import json
+import os
+import socket
+
+# The Unix domain socket the resident CLEARS daemon listens on
+DAEMON_SOCKET = "/run/clears.sock"
+
+
+def request_daemon(request: dict, socket_path=DAEMON_SOCKET):
+    """
+    Hand an action over to the resident CLEARS daemon
+    Deliberately light: only the standard library is imported, so the CLI starts fast
+    :param request: the action and its parameters
+    :param socket_path: the daemon socket
+    :return: the daemon's response, or None if no daemon is running
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(socket_path)
+            client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            client.shutdown(socket.SHUT_WR)
+
+            chunks = []
+            while True:
+                chunk = client.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+
+    except (FileNotFoundError, ConnectionRefusedError, PermissionError):
+        return None
+
+    return json.loads(b"".join(chunks).decode("utf-8"))
+
+
+def resolve_resources(resources, resource_type):
+    """
+    Resolve file/directory resources on the client, with the credentials of the user: glob patterns are expanded and
+    paths made absolute and canonical against the working directory of the client
+    The daemon takes the paths of regular users literally, it never looks at what they cannot see
+    :param resources: a resource, a list of them, or None
+    :param resource_type: type of the resources (1:file/directory, 2:computational partition)
+    :return: the resources, resolved for files/directories
+    """
+    if resource_type != 1 or not resources:
+        return resources
+
+    resolved = []
+    for resource in [resources] if isinstance(resources, str) else resources:
+        resource = os.path.abspath(resource)
+        matches = sorted(glob.glob(resource)) if glob.has_magic(resource) and not os.path.exists(resource) else []
+        if not matches:
+            # A plain path, or a pattern matching nothing: reported as missing by the daemon
+            matches = [resource]
+        resolved.extend(os.path.realpath(match) for match in matches)
+    return resolved
@@ -1,25 +1,44 @@
 #!/usr/bin/python3
 
-import grp
-import json
+import glob
 import os
-import pwd
+import stat
+import struct
 import subprocess
-
-from classes.collab import Network, from_dict
-from ldap.add_user import add_user_to_group
-from ldap.connect_ldap import connect_to_ldap
-from ldap.create_group import create_group
+import threading
+import time
+from contextlib import contextmanager
+
+from classes.collab import Network
+from ldap.add_user import add_users_to_group
+from ldap.connect_ldap import get_ldap_pool
+from ldap.create_group import create_group, get_group_gid
 from ldap.delete_group import delete_group
 from ldap.remove_user import remove_user_from_group
-
-
-def dump_network_to_file(project_file: str, network: Network):
-
-    # network.print_network()
-
-    network_json = json.dumps(network.to_dict(), indent=4)
-
+from utilities.durability import durability_scope, require_durable, require_durable_file_system
+from utilities.gid_allocator import GidAllocator
+from utilities.identity import forget_group, gid_of, prime_users, remember_group, uid_of, username_of
+from utilities.journal import get_journal_path
+from utilities.mounts import get_file_system_type
+from utilities.nfs4_acl import ACE4_DIRECTORY_INHERIT_ACE, ACE4_FILE_INHERIT_ACE
+from utilities.nfs4_acl import update_acl as update_nfs4_acl
+from utilities.posix_acl import ACL_ACCESS, ACL_DEFAULT
+from utilities.posix_acl import update_acl as update_posix_acl
+from utilities.project_lock import ProjectLocks, get_lock_path
+from utilities.project_store import ProjectStore
+from utilities.propagate import propagate_tree
+from utilities.reconcile import NetworkState, PrivilegeChanges, reconcile
+from utilities.slurm import SlurmUpdateBatch, get_slurm_partitions
+
+
+def write_project_file(project_file: str, content: bytes, append=False) -> bool:
+    """
+    Write (or append to) a file within /etc/project through the privileged C wrapper
+    :param project_file: path of the file to write
+    :param content: the bytes to write
+    :param append: append to the file instead of replacing it
+    :return: True on success
+    """
     # Get the directory path of the currently executing Python script
     script_dir = os.path.dirname(os.path.realpath(__file__))
 
@@ -31,68 +50,392 @@ def dump_network_to_file(project_file: str, network: Network):
         raise FileNotFoundError(f"Wrapper script '{wrapper_script_path}' not found.")
 
     try:
-        # Call the C wrapper with the project file and network JSON
+        # Call the C wrapper with the project file and the content on stdin
         # result = subprocess.run([wrapper_script_path, project_file, network_json], check=True, text=True, capture_output=True)
+        command = [wrapper_script_path, "-a", project_file] if append else [wrapper_script_path, project_file]
         result = subprocess.run(
-            [wrapper_script_path, project_file],
-            input=network_json,
-            text=True,
+            command,
+            input=content,
             capture_output=True,
             check=True
         )
-        print(result.stdout)
+        print(result.stdout.decode())
+        return True
 
     except subprocess.CalledProcessError as e:
-        print(f"Failed to create project '{network.get_project_id()}': {e.stderr}")
+        print(f"Failed to update '{project_file}': {e.stderr.decode()}")
+        return False
+
+
+def archive_project_file(project_file: str, archive_file: str) -> bool:
+    """
+    Move a file within /etc/project to the archive through the privileged C wrapper
+    :param project_file: path of the file to archive
+    :param archive_file: its path in the archive
+    :return: True on success
+    """
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+    wrapper_script_path = os.path.join(script_dir, "wrapper_network_dump")
+
+    result = subprocess.run([wrapper_script_path, "-m", project_file, archive_file], capture_output=True)
+    if result.returncode != 0:
+        print(f"Failed to archive '{project_file}': {result.stderr.decode()}")
+        return False
+    print(result.stdout.decode(), end="")
+    return True
+
+
+def update_partitions(content: bytes) -> bool:
+    """
+    Set the AllowGroups of Slurm partitions through the privileged C wrapper
+    :param content: one "<partition> <group1,group2,...>" line per partition
+    :return: True on success
+    """
+    # Construct the full path to the C wrapper
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+    wrapper_supdate_path = os.path.join(script_dir, "wrapper_supdate")
+
+    result = subprocess.run([wrapper_supdate_path], input=content)
+    if result.returncode != 0:
+        print("Failed to update the AllowGroups of one or more partitions")
+        return False
+    return True
+
+
+# Loads (cached, revalidated on every load) and saves every project
+project_store = ProjectStore(writer=write_project_file)
+
 
+class BatchSession:
+    """
+    Keeps the networks of the projects touched by a batch of operations in memory
+    Each project is loaded once through the project store, and written once when the session closes
+    """
+
+    def __init__(self):
+        self.__networks: dict[str, Network] = dict()
+        # Mutations of the operations that completed, per project
+        self.__mutations: dict[str, list] = dict()
+        # Projects (re)created within the batch, written as snapshots
+        self.__snapshots: set[str] = set()
+        self.__failed: set[str] = set()
+
+    def load(self, project_file: str) -> Network:
+        network = self.__networks.get(project_file)
+        if network is None:
+            network = project_store.load(project_file)
+            self.__networks[project_file] = network
+            self.__mutations[project_file] = []
+        return network
+
+    def save(self, project_file: str, network: Network, snapshot=False):
+        # The operation completed: its mutations are kept for the final write
+        if snapshot:
+            # A snapshot supersedes everything recorded before it
+            self.__snapshots.add(project_file)
+            self.__mutations[project_file] = []
+        self.__networks[project_file] = network
+        self.__mutations.setdefault(project_file, []).extend(network.drain_mutations())
+
+    def rollback(self, project_file: str):
+        """
+        Drop the changes of an operation that failed midway, the network is rebuilt from the project as stored
+        with the mutations of the completed operations replayed on top
+        :param project_file: path of the project file
+        """
+        network = self.__networks.get(project_file)
+        if network is None or not network.drain_mutations():
+            return
+        if project_file in self.__snapshots:
+            network = Network(usernames=set(), project_id=network.get_project_id())
+        else:
+            network = project_store.load(project_file)
+        for mutation in self.__mutations[project_file]:
+            network.apply_mutation(mutation)
+        self.__networks[project_file] = network
+
+    def detach(self, project_file: str) -> bool:
+        """
+        Write a project now and stop tracking it (e.g. before it is archived)
+        :param project_file: path of the project file
+        :return: True on success
+        """
+        network = self.__networks.pop(project_file, None)
+        if network is None:
+            return True
+        mutations = self.__mutations.pop(project_file) + network.drain_mutations()
+        snapshot = project_file in self.__snapshots
+        self.__snapshots.discard(project_file)
+        if not project_store.save(project_file, network, mutations, snapshot=snapshot):
+            self.__failed.add(project_file)
+            return False
+        return True
+
+    def close(self):
+        # Write every project touched by the batch once
+        for project_file, network in self.__networks.items():
+            if not project_store.save(project_file, network, self.__mutations[project_file],
+                                      snapshot=project_file in self.__snapshots):
+                self.__failed.add(project_file)
+
+    def get_failed_projects(self) -> set[str]:
+        return self.__failed
 
-def group_exists_and_max_gid(group_name):
+
+class _BatchState(threading.local):
+    # The batch session in progress in the current thread, if any
+    session = None
+
+
+_batch_state = _BatchState()
+
+
+@contextmanager
+def batch_session(project_files=(), created_files=()):
     """
-    A helper function to check whether a group exists in the system, if not generate the highest gid assigned so far
-    :param group_name: name of the group
-    :return: a pair (EXISTS_OR_NOT, max_gid)
+    Run a batch of operations: projects are loaded and written once, and the ACL durability barriers and the
+    Slurm AllowGroups updates are deferred to the end of the batch
+    :param project_files: the projects the batch operates on, locked (in sorted order) until they are written
+    :param created_files: the projects the batch creates, locked as well even though they do not exist yet
     """
+    session = BatchSession()
+    _batch_state.session = session
     try:
-        max_gid = -1
-        group_exists = False
+        with project_locks.holding(project_files, created_files), durability_scope(), slurm_updates.deferred():
+            try:
+                yield session
+            finally:
+                session.close()
+    finally:
+        _batch_state.session = None
+
+
+def open_network(project_file: str) -> Network:
+    """
+    Load a project (snapshot and journal), whichever format it is stored in, or take it from the batch session
+    The project is parsed at most once per command, later loads are served from the project store
+    :param project_file: path of the project file
+    :return: the up-to-date network
+    """
+    if _batch_state.session is not None:
+        return _batch_state.session.load(project_file)
+    return project_store.load(project_file)
+
+
+def open_network_for_update(project_file: str, compute):
+    """
+    Load a project and compute the changes of an operation to its network optimistically: the computation runs
+    without holding the project, which is then locked and checked to still be at the version the computation
+    started from; if another operation committed meanwhile, the computation is redone on the current network
+    The computation must not issue any side effect (LDAP, ACLs, AllowGroups), only change the network
+    :param project_file: path of the project file
+    :param compute: callable (network) -> result
+    :return: (network, result), the project is left locked (released with project_locks.release); if an exception
+             is raised, it is not
+    """
+    if _batch_state.session is not None or project_locks.is_held(project_file):
+        # The project is already held by this thread (e.g. for a whole batch), nobody else can write it
+        project_locks.acquire(project_file)
+        try:
+            network = open_network(project_file)
+            return network, compute(network)
+        except BaseException:
+            project_locks.release(project_file)
+            raise
+
+    signature = project_store.get_signature(project_file)
+    try:
+        network = project_store.load(project_file)
+    except (ValueError, IndexError, struct.error):
+        # Snapshots are replaced atomically, but a project file written by an older wrapper, or a snapshot and journal
+        # read across a compaction, may not decode: treated as a conflict, the project is read again under the lock
+        network = None
+    if network is not None:
+        version = network.get_journal_seq()
+        result = compute(network)
+
+    project_locks.acquire(project_file)
+    try:
+        # Fast path: neither the snapshot nor the journal was written since they were read
+        if network is not None and (project_store.get_signature(project_file) == signature
+                                    or project_store.get_version(project_file) == version):
+            return network, result
+
+        # Conflict: start over from the current network, under the lock this time so that it cannot conflict again
+        network = project_store.load(project_file)
+        return network, compute(network)
+    except BaseException:
+        project_locks.release(project_file)
+        raise
+
+
+def dump_network_to_file(project_file: str, network: Network, snapshot=False) -> bool:
+    """
+    Persist the changes made to a network
+    Only the mutations are appended to the project journal, unless a full snapshot is due
+    Within a batch session the write is deferred to the end of the batch
+    :param project_file: path of the project file
+    :param network: the network to persist
+    :param snapshot: force a full snapshot (e.g. when (re)creating a project)
+    :return: True on success
+    """
+
+    # network.print_network()
+
+    if _batch_state.session is not None:
+        _batch_state.session.save(project_file, network, snapshot=snapshot)
+        return True
+
+    return project_store.save(project_file, network, network.drain_mutations(), snapshot=snapshot)
 
-        # Run getent group command and capture output
-        output = subprocess.check_output(['getent', 'group']).decode('utf-8')
-        lines = output.strip().split('\n')
 
-        for line in lines:
-            parts = line.split(':')
-            if parts[0] == group_name:
-                group_exists = True
+# Persistent allocator of the gids of collaboration groups
+gid_allocator = GidAllocator(state_file="/etc/project/.gid_allocator.json", writer=write_project_file)
 
-            # Extract the group ID
-            gid = int(parts[2])
+# Advisory locks of the projects, held across each read-modify-write
+project_locks = ProjectLocks(writer=write_project_file)
 
-            if gid > max_gid and 10000 < gid < 20000:
-                max_gid = gid
+# AllowGroups changes, applied once per partition at the end of a command
+slurm_updates = SlurmUpdateBatch(get_slurm_partitions(), updater=update_partitions)
 
-        return group_exists, max_gid
 
-    except subprocess.CalledProcessError:
-        # Handle error if getent group command fails
-        return False, -1
+def ensure_collaboration_group(conn, group_name: str, user_ids: set[str]):
+    """
+    Make sure the LDAP group of a collaboration exists and holds all its members
+    The number of LDAP round trips does not grow with the size of the collaboration
+    :param conn: a bound LDAP connection
+    :param group_name: name of the group (project id followed by the sorted uids of the collaboration)
+    :param user_ids: uids of the members
+    :return: False if the group could not be created or the members could not be added
+    """
+    group_dn = f"cn={group_name},ou=groups,dc=rc,dc=example,dc=org"
+    usernames = [username_of(user_id) for user_id in user_ids]
+
+    # Existence check and gid allocation are answered by the allocator index, atomically
+    with gid_allocator.transaction():
+        if gid_allocator.lookup(group_name) is None:
+            gid = gid_allocator.allocate(group_name)
+
+            # Create the group together with its initial members in one add, the allocation is dropped if it raises
+            if create_group(conn=conn, group_dn=group_dn, group_name=group_name, gid_number=gid,
+                            member_uids=usernames):
+                # NSS may not know the new group yet, later gid lookups are served from memory
+                remember_group(group_name, gid)
+                return True
+
+            # The group already exists outside of the allocator's knowledge: its actual gid is recorded instead
+            existing_gid = get_group_gid(conn, group_dn)
+            if existing_gid is None:
+                gid_allocator.cancel(group_name)
+                print(f"Failed to create the group {group_name}: {conn.result}")
+                return False
+            gid_allocator.record(group_name, existing_gid)
+            remember_group(group_name, existing_gid)
+
+    # Add all members in one modify
+    return add_users_to_group(conn=conn, group_dn=group_dn, user_uids=usernames)
 
 
 def get_file_system(path: str):
     """
-    Obtain the file system of a file/directory from resource stats
+    Obtain the file system of a file/directory from the mount table (parsed in-process, cached per invocation)
     :param path: absolute path of the file/directory
     :return: file system
     """
     try:
-        result = subprocess.run(["stat", "-f", "-c", "%T", path], capture_output=True, text=True, check=True)
-        filesystem_type = result.stdout.strip()
-        return filesystem_type
+        return get_file_system_type(path)
     except Exception as e:
         print(f"Error: {e}")
 
 
-def create_project(project_id: str):
+def open_resource(resource_path: str) -> int:
+    """
+    Open a file/directory without following any symbolic link on its path, one component at a time
+    Checks and updates made through the descriptor concern that very file, even if the path is swapped for a link to
+    another file (e.g. /etc/shadow) in the meantime
+    :param resource_path: absolute, canonical path of the file/directory
+    :return: an open file descriptor, to be closed by the caller
+    """
+    fd = os.open("/", os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        components = [component for component in resource_path.split("/") if component]
+        for index, component in enumerate(components):
+            if index < len(components) - 1:
+                flags = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW
+            else:
+                # Devices, FIFOs and sockets are never shared, O_NONBLOCK keeps a FIFO from blocking the open
+                flags = os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK
+            next_fd = os.open(component, flags, dir_fd=fd)
+            os.close(fd)
+            fd = next_fd
+
+        mode = os.fstat(fd).st_mode
+        if not (stat.S_ISREG(mode) or stat.S_ISDIR(mode)):
+            raise PermissionError(f"'{resource_path}' is not a regular file or a directory")
+        return fd
+    except BaseException:
+        os.close(fd)
+        raise
+
+
+def update_resource_acl(resource_path: str, grant_groups=(), revoke_groups=(), recursive=False, owner_uids=None):
+    """
+    Revoke and grant collaboration groups in the ACL of a file/directory
+    The ACL is read once and all the changes are written back at once, through a descriptor opened without following
+    symbolic links, whose owner is checked first
+    :param resource_path: absolute path of the file/directory
+    :param grant_groups: names of the groups to grant access to
+    :param revoke_groups: names of the groups to revoke access from
+    :param recursive: also update everything below a directory, and the ACL inherited by new entries
+    :param owner_uids: uids that may own the file/directory (its sharer), None to skip the check (revocations only)
+    """
+    revoke = [gid_of(group) for group in revoke_groups]
+
+    if get_file_system(resource_path) == "nfs":
+        # nfs: the groups get an RX ALLOW ACE, inherited by new entries of a recursively shared directory
+        grant = {gid_of(group): "RX" for group in grant_groups}
+
+        def make_apply(grant: dict):
+            def apply(target, is_directory: bool):
+                inherit = ACE4_FILE_INHERIT_ACE | ACE4_DIRECTORY_INHERIT_ACE if recursive and is_directory else 0
+                update_nfs4_acl(target, grant=grant, revoke=revoke, flag=inherit)
+            return apply
+    else:
+        # ext: the groups' entries get rwx (rwX below a recursively shared directory), the mask is recomputed
+        grant = {gid_of(group): "rwX" if recursive else "rwx" for group in grant_groups}
+
+        def make_apply(grant: dict):
+            def apply(target, is_directory: bool):
+                update_posix_acl(target, grant=grant, revoke=revoke, attribute=ACL_ACCESS)
+                if recursive and is_directory:
+                    update_posix_acl(target, grant=grant, revoke=revoke, attribute=ACL_DEFAULT)
+            return apply
+
+    apply = make_apply(grant)
+
+    fd = open_resource(resource_path)
+    try:
+        metadata = os.fstat(fd)
+        if owner_uids is not None and metadata.st_uid not in owner_uids:
+            raise PermissionError(f"'{resource_path}' is not owned by its sharer")
+        is_directory = stat.S_ISDIR(metadata.st_mode)
+        apply(fd, is_directory)
+
+        if not (recursive and is_directory):
+            # Only this inode needs flushing, once per command, through the descriptor it was updated through
+            require_durable(fd)
+            return
+
+        # Everything the owner of the directory owns below it, then one syncfs instead of an fsync per entry
+        # Collaborators' files inherited the revoked groups too: the revocation reaches them, the grant does not
+        propagate_tree(resource_path, apply, owner_uid=metadata.st_uid, identity=(metadata.st_dev, metadata.st_ino),
+                       apply_foreign=make_apply(dict()) if revoke else None)
+        require_durable_file_system(fd)
+    finally:
+        os.close(fd)
+
+
+def create_project(project_id: str) -> bool:
     """
     It is an administrative action to initiate a project
     This initializes the corresponding project file within /etc/project directory
@@ -110,11 +453,12 @@ def create_project(project_id: str):
     # Create the full path for the project
     project_file = os.path.join(base_dir, project_id) + ".json"
 
-    # Dump the network to the project file
-    dump_network_to_file(project_file, network)
+    # Dump the network to the project file, after the operations in progress on a previous project of that name
+    with project_locks.holding([project_file], created_files=[project_file]):
+        return dump_network_to_file(project_file, network, snapshot=True)
 
 
-def add_collaborator(project_id: str, users: set[str]):
+def add_collaborator(project_id: str, users: set[str]) -> bool:
     """
     It is an administrative action to add collaborators to a project
     :param project_id: The unique identifier to refer to the project
@@ -126,28 +470,65 @@ def add_collaborator(project_id: str, users: set[str]):
     # Create the full path for the project
     project_file = os.path.join(base_dir, project_id) + ".json"
 
+    acquired = False
     try:
-        # Read all lines from the project file
-        with open(project_file, "r") as file:
-            data = json.load(file)
-            network = Network(
-                usernames=set(data['all_user_ids']),
-                project_id=data['project_id'],
-                contexts={key: from_dict(context_data) for key, context_data in data["contexts"].items()}
-            )
+        # Hold the project across its read-modify-write, concurrent operations on it queue here
+        project_locks.acquire(project_file)
+        acquired = True
+
+        # Read the project file (snapshot and journal), whichever format it is stored in
+        network = open_network(project_file)
 
         for new_username in users:
-            new_user_id = pwd.getpwnam(new_username).pw_uid
+            new_user_id = uid_of(new_username)
             # network.add_new_user(user=str(new_user_id))
             network.add_new_user(user=new_username)
             print(f"{new_username}(uid={new_user_id}) successfully added to {project_id}")
 
-        dump_network_to_file(project_file, network)
+        return dump_network_to_file(project_file, network)
 
     except FileNotFoundError:
         print("Error: Project not found.")
+        return False
     except Exception as e:
         print(f"Error: {e}")
+        return False
+
+    finally:
+        if acquired:
+            project_locks.release(project_file)
+
+
+def expand_resources(resource_ids, resource_type: int, expand=True) -> list:
+    """
+    Normalize the resources of a share/unshare: a single resource, a list of them, or glob patterns of
+    files/directories
+    :param resource_ids: a resource id or a list of resource ids
+    :param resource_type: type of the resources (1:file/directory, 2:computational partition)
+    :param expand: expand glob patterns and resolve symbolic links; False for paths already resolved by the client
+                   with the requesting user's own credentials, which the daemon must not probe with its own
+    :return: the resources (canonical absolute paths for files/directories) in order, without duplicates
+    """
+    if isinstance(resource_ids, str):
+        resource_ids = [resource_ids]
+
+    resources = []
+    for resource_id in resource_ids:
+        if resource_type != 1:
+            resources.append(resource_id)
+        elif not expand:
+            # Taken literally, a symbolic link on the path is refused when the resource is opened
+            resources.append(os.path.abspath(resource_id))
+        elif any(character in resource_id for character in "*?[") and not os.path.exists(resource_id):
+            matches = sorted(glob.glob(resource_id))
+            if not matches:
+                print(f"No file or directory matches '{resource_id}'")
+            resources.extend(os.path.realpath(match) for match in matches)
+        else:
+            # Symbolic links are resolved once here, the resources are then opened without following any
+            resources.append(os.path.realpath(resource_id))
+
+    return list(dict.fromkeys(resources))
 
 
 def can_share(from_username: str, resource_id: str, to_username: str, project_id: str, resource_type: int) -> bool:
@@ -161,8 +542,8 @@ def can_share(from_username: str, resource_id: str, to_username: str, project_id
     :return: Allow (True) or Deny (False)
     """
 
-    from_user_id = pwd.getpwnam(from_username).pw_uid
-    to_user_id = pwd.getpwnam(to_username).pw_uid
+    from_user_id = uid_of(from_username)
+    to_user_id = uid_of(to_username)
 
     # Step 0: self-share is not permitted
     if from_user_id == to_user_id:
@@ -187,15 +568,9 @@ def can_share(from_username: str, resource_id: str, to_username: str, project_id
 
     # Computational Partition
     elif resource_type == 2:
-        # Run the scontrol show partition command and capture the output
-        result = subprocess.run(['scontrol', 'show', 'partition'], stdout=subprocess.PIPE, text=True)
-        output = result.stdout.splitlines()
-
-        for line in output:
-            if line.startswith('PartitionName='):
-                partition_name = line.split("=")[1]
-                if partition_name.startswith(from_username) and partition_name == resource_id:
-                    owner_uid = pwd.getpwnam(from_username).pw_uid
+        # Answered from the partitions fetched once per command
+        if get_slurm_partitions().is_owner(resource_id, from_username):
+            owner_uid = uid_of(from_username)
 
     # Step 2: Obtain the user list of the project
     # Define the base directory
@@ -205,23 +580,20 @@ def can_share(from_username: str, resource_id: str, to_username: str, project_id
     project_file = os.path.join(base_dir, project_id) + ".json"
 
     try:
-        # Read all lines from the project file
-        with open(project_file, "r") as file:
-            data = json.load(file)
+        # Read the project file (snapshot and journal), whichever format it is stored in
+        collaborators = open_network(project_file).get_all_user_ids()
 
-            collaborators = data['all_user_ids']
-
-            # Check for the two constraints
-            if owner_uid != from_user_id:
-                print(f"Sharing Error: The requesting user {from_username} is not the owner of the resource")
+        # Check for the two constraints
+        if owner_uid != from_user_id:
+            print(f"Sharing Error: The requesting user {from_username} is not the owner of the resource")
+            return False
+        else:
+            if (from_username not in collaborators) or (to_username not in collaborators):
+                print(f"Sharing Error: {from_username} and {to_username} are not collaborators within {project_id}")
                 return False
             else:
-                if (from_username not in collaborators) or (to_username not in collaborators):
-                    print(f"Sharing Error: {from_username} and {to_username} are not collaborators within {project_id}")
-                    return False
-                else:
-                    print(f"Sharing {resource_path} Allowed: From {from_username} to {to_username}")
-                    return True
+                print(f"Sharing {resource_path} Allowed: From {from_username} to {to_username}")
+                return True
 
     except FileNotFoundError:
         print(f"Sharing Error: Project {project_id} not found.")
@@ -230,18 +602,18 @@ def can_share(from_username: str, resource_id: str, to_username: str, project_id
         print(f"Sharing Error: {e}")
         return False
 
-def can_do_batch(from_username: str, resource_id: str, to_usernames: list, project_id: str, resource_type: int) -> bool:
+def can_do_batch(from_username: str, resource_id, to_usernames: list, project_id: str, resource_type: int) -> bool:
     """
     An optimized version of can_share () and can_unshare ()
     :param from_username:
-    :param resource_id:
+    :param resource_id: a resource id, or a list of resource ids authorized at once
     :param to_usernames:
     :param project_id:
     :param resource_type:
     :return:
     """
 
-    from_user_id = pwd.getpwnam(from_username).pw_uid
+    from_user_id = uid_of(from_username)
 
     if '' in to_usernames:
         print("[Un]Sharing Error: One or more recipient usernames are empty.")
@@ -250,36 +622,53 @@ def can_do_batch(from_username: str, resource_id: str, to_usernames: list, proje
         print("[Un]Sharing Error: Self-sharing attempted.")
         return False
 
-    owner_uid = -1
-    resource_path = resource_id
-
-    if resource_type == 1:
-        resource_path = os.path.abspath(resource_id)
-        owner_uid = os.stat(resource_path).st_uid
-    elif resource_type == 2:
-        result = subprocess.run(['scontrol', 'show', 'partition'], stdout=subprocess.PIPE, text=True)
-        output = result.stdout.splitlines()
-        for line in output:
-            if line.startswith('PartitionName='):
-                partition_name = line.split("=")[1]
-                if partition_name.startswith(from_username) and partition_name == resource_id:
-                    owner_uid = from_user_id
-
-    if owner_uid != from_user_id:
-        print(f"[Un]Sharing Error: {from_username} is not the owner of the resource.")
+    resource_ids = [resource_id] if isinstance(resource_id, str) else list(resource_id)
+    if not resource_ids:
+        print("[Un]Sharing Error: No resource mentioned.")
         return False
 
+    # The requesting user must own every resource
+    for resource_id in resource_ids:
+        owner_uid = -1
+        resource_path = resource_id
+
+        if resource_type == 1:
+            resource_path = os.path.abspath(resource_id)
+            # The resource itself, never the target of a symbolic link
+            # Missing, unreachable and foreign resources are reported alike, so that nothing is learnt about paths
+            # the user cannot see
+            try:
+                fd = open_resource(resource_path)
+            except OSError:
+                print(f"[Un]Sharing Error: {resource_path} does not exist or is not owned by {from_username}.")
+                return False
+            try:
+                owner_uid = os.fstat(fd).st_uid
+            finally:
+                os.close(fd)
+            if owner_uid != from_user_id:
+                print(f"[Un]Sharing Error: {resource_path} does not exist or is not owned by {from_username}.")
+                return False
+        elif resource_type == 2:
+            if get_slurm_partitions().is_owner(resource_id, from_username):
+                owner_uid = from_user_id
+
+        if owner_uid != from_user_id:
+            print(f"[Un]Sharing Error: {from_username} is not the owner of the resource {resource_path}.")
+            return False
+
     project_file = f"/etc/project/{project_id}.json"
     try:
-        with open(project_file, "r") as file:
-            data = json.load(file)
-            collaborators = set(data['all_user_ids'])
+        collaborators = open_network(project_file).get_all_user_ids()
 
         if from_username not in collaborators or not all(user in collaborators for user in to_usernames):
             print(f"[Un]Sharing Error: One or more users not collaborators in {project_id}")
             return False
 
-        print(f"[Un]Sharing {resource_path} Allowed")
+        if len(resource_ids) == 1:
+            print(f"[Un]Sharing {resource_path} Allowed")
+        else:
+            print(f"[Un]Sharing {len(resource_ids)} resources Allowed")
         return True
 
     except FileNotFoundError:
@@ -291,28 +680,37 @@ def can_do_batch(from_username: str, resource_id: str, to_usernames: list, proje
 
 
 
-def share(from_username: str, resource_id_to_share: str, to_usernames: set[str], project_id: str, resource_type: int):
+@durability_scope()
+@slurm_updates.deferred()
+def share(from_username: str, resource_id_to_share, to_usernames: set[str], project_id: str,
+          resource_type: int, recursive=False, expand=True) -> bool:
     """
     This is the user action share that first authorizes the action with respect to can_share and then performs the share
+    Several resources may be shared at once: they are authorized, recorded in the network and given their groups once,
+    only the privilege updates are made per resource
     :param resource_type: type of resource (1:file/directory, 2:computational partition)
     :param from_username: which user is requesting to share?
-    :param resource_id_to_share: what resource (privilege) is concerned?
+    :param resource_id_to_share: what resource (privilege) is concerned? a resource, a list or glob patterns of them
     :param to_usernames: to which users is it being shared?
     :param project_id: under which project context the sharing is taking place?
-    :return:
+    :param recursive: also share everything below the directories (and what is created there later)
+    :param expand: expand glob patterns and resolve symbolic links (see expand_resources)
+    :return: True on success
     """
     # can_share_flag = True
     # for to_username in to_usernames.copy():
     #     if not can_share(from_username, resource_id_to_share, to_username, project_id, resource_type):
     #         can_share_flag = False
 
+    resource_paths = expand_resources(resource_id_to_share, resource_type, expand=expand)
+
     can_share_flag = can_do_batch(
-        from_username, resource_id_to_share, list(to_usernames), project_id, resource_type
+        from_username, resource_paths, list(to_usernames), project_id, resource_type
     )
 
     if not can_share_flag:
         print("One of more (from_user, resource, to_user) sharing query is not permitted")
-        return
+        return False
 
     # Define the base directory
     base_dir = "/etc/project"
@@ -320,125 +718,94 @@ def share(from_username: str, resource_id_to_share: str, to_usernames: set[str],
     # Create the full path for the project
     project_file = os.path.join(base_dir, project_id) + ".json"
 
-    # Get the directory path of the currently executing Python script
-    script_dir = os.path.dirname(os.path.realpath(__file__))
-
-    # Construct the full path to the c wrappers
-    wrapper_supdate_path = os.path.join(script_dir, "wrapper_supdate")
-
-    # Set up the LDAP Connection
-    conn = connect_to_ldap()
-
+    ldap_pool = get_ldap_pool()
+    acquired = False
     try:
-        # Read all lines from the project file
-        with open(project_file, "r") as file:
-            data = json.load(file)
-            network = Network(
-                usernames=set(data['all_user_ids']),
-                project_id=data['project_id'],
-                contexts={key: from_dict(context_data) for key, context_data in data["contexts"].items()}
-            )
-
-        from_user_id = str(pwd.getpwnam(from_username).pw_uid)
-        to_user_ids = set(str(pwd.getpwnam(to_username).pw_uid) for to_username in to_usernames)
-
-        resource_path = resource_id_to_share
-        if resource_type == 1:
-            resource_path = os.path.abspath(resource_id_to_share)
-
-        # Share and Update the Collaboration Network
-        already_shared_users, correct_users = (
-            network.share_resource(from_user_id, resource_path, to_user_ids, resource_type))
-
-        # Now derive the correct collaboration context
-        correct_context = project_id + ''.join(sorted(correct_users))
-
-        group_exists, max_gid = group_exists_and_max_gid(group_name=correct_context)
-
-        # Add the new group (collaboration) if it doesn't exist
-        if not group_exists:
-            create_group(
-                conn=conn,
-                group_dn=f"cn={correct_context},ou=groups,dc=rc,dc=example,dc=org",
-                group_name=correct_context,
-                gid_number=max_gid + 1
-            )
-
-        # Assign users to the group (collaboration)
-        for user_id in correct_users:
-            user = pwd.getpwuid(int(user_id))[0]
-            add_user_to_group(
-                conn=conn,
-                group_dn=f"cn={correct_context},ou=groups,dc=rc,dc=example,dc=org",
-                user_uid=user
-            )
-
-        # Update the privileges accordingly
-        print(resource_path)
-        # File/Directory
-        if resource_type == 1:
-
-            # Revoke rwx access to the group in the ACL of the file
-            if already_shared_users is not None:
+        # Set up the LDAP Connection, borrowed for the whole operation: a failure to bind is reported like any other
+        # error, and a connection that failed is not handed back for reuse
+        with ldap_pool.connection() as conn:
+            from_user_id = str(uid_of(from_username))
+            to_user_ids = set(str(uid_of(to_username)) for to_username in to_usernames)
+
+            def share_in_network(network: Network) -> list:
+                # Share and Update the Collaboration Network, for every resource
+                shares = []
+                for resource_path in resource_paths:
+                    already_shared_users, correct_users = (
+                        network.share_resource(from_user_id, resource_path, to_user_ids, resource_type))
+                    # A recursively shared directory stays recursive until it is no longer shared
+                    if resource_type == 1 and recursive:
+                        network.set_recursive(resource_path, resource_type, True)
+                    shares.append((resource_path, already_shared_users, correct_users))
+                return shares
+
+            # Read the project file and compute the new network without holding the project, it is locked from here on
+            network, shares = open_network_for_update(project_file, share_in_network)
+            acquired = True
+
+            # Add each new group (collaboration) with its members, or the members to the existing group, once
+            correct_collaborations = {project_id + ''.join(sorted(correct_users)): correct_users
+                                      for _, _, correct_users in shares}
+            for correct_context, correct_users in correct_collaborations.items():
+                if not ensure_collaboration_group(conn=conn, group_name=correct_context, user_ids=correct_users):
+                    # Nothing was granted yet, the project is left as it was
+                    print(f"Error: the collaboration group {correct_context} could not be set up.")
+                    return False
 
-                already_shared_context = project_id + ''.join(sorted(already_shared_users))
+            # Update the privileges accordingly
+            for resource_path, already_shared_users, correct_users in shares:
 
-                if get_file_system(resource_path) == "nfs":
-                    grp_id = grp.getgrnam(already_shared_context).gr_gid
-                    subprocess.run(["nfs4_setfacl", "-x", f"A:g:{grp_id}:rxtcy", resource_path])
-                else:
-                    subprocess.run(["setfacl", "-x", f"g:{already_shared_context}", resource_path])  # ext
+                # Now derive the correct collaboration context
+                correct_context = project_id + ''.join(sorted(correct_users))
 
-                subprocess.run(["sync"])
+                print(resource_path)
+                # File/Directory
+                if resource_type == 1:
 
-                already_shared_unames = set(
-                    pwd.getpwuid(int(already_shared_uid))[0] for already_shared_uid in already_shared_users)
-                print(f"Collaboration '{already_shared_unames}' removed access to resource '{resource_path}'.")
+                    # Move the access from the group already enjoying it to the correct group in one ACL update
+                    revoke_groups = []
+                    if already_shared_users is not None:
+                        revoke_groups.append(project_id + ''.join(sorted(already_shared_users)))
 
-            # Assign rwx access to the group in the ACL of the file
-            if get_file_system(resource_path) == "nfs":
-                grp_id = grp.getgrnam(correct_context).gr_gid
-                subprocess.run(["nfs4_setfacl", "-a", f"A:g:{grp_id}:RX", resource_path])
-            else:
-                subprocess.run(["setfacl", "-m", f"g:{correct_context}:rwx", resource_id_to_share])
+                    update_resource_acl(resource_path, grant_groups=[correct_context], revoke_groups=revoke_groups,
+                                        recursive=network.is_recursive(resource_path, resource_type),
+                                        owner_uids={int(from_user_id)})
 
-            subprocess.run(["sync"])
+                    if already_shared_users is not None:
+                        already_shared_unames = set(
+                            username_of(already_shared_uid) for already_shared_uid in already_shared_users)
+                        print(f"Collaboration '{already_shared_unames}' removed access to resource '{resource_path}'.")
 
-        # Computational Partition
-        elif resource_type == 2:
+                # Computational Partition
+                elif resource_type == 2:
 
-            result = subprocess.run(['scontrol', 'show', 'partition', resource_path],
-                                    stdout=subprocess.PIPE, text=True)
-            relevant_output = result.stdout.splitlines()[1]  # 'AllowGroups=grp_c AllowAccounts=ALL AllowQos=ALL'
-            relevant_config = relevant_output.split()[0]  # 'AllowGroups=grp_c'
-            existing_allowed_groups = set(relevant_config.split("=")[1].split(","))  # ('grp_c')
+                    existing_allowed_groups = get_slurm_partitions().get_allow_groups(resource_path)  # ('grp_c')
 
-            existing_allowed_groups.add(correct_context)
+                    existing_allowed_groups.add(correct_context)
 
-            # Revoke access to the group
-            if already_shared_users is not None:
-                already_shared_context = project_id + ''.join(sorted(already_shared_users))
-                existing_allowed_groups.remove(already_shared_context)
+                    # Revoke access to the group
+                    if already_shared_users is not None:
+                        already_shared_context = project_id + ''.join(sorted(already_shared_users))
+                        existing_allowed_groups.remove(already_shared_context)
 
-                already_shared_unames = set(
-                    pwd.getpwuid(int(already_shared_uid))[0] for already_shared_uid in already_shared_users)
-                print(f"Collaboration '{already_shared_unames}' removed access to resource '{resource_path}'.")
+                        already_shared_unames = set(
+                            username_of(already_shared_uid) for already_shared_uid in already_shared_users)
+                        print(f"Collaboration '{already_shared_unames}' removed access to resource '{resource_path}'.")
 
-            # Assign access to the group
-            correct_new_group = existing_allowed_groups
-            new_context = ','.join(correct_new_group)
-            subprocess.run([wrapper_supdate_path, resource_path, new_context])
+                    # Assign access to the group
+                    slurm_updates.set_allow_groups(resource_path, existing_allowed_groups)
 
-        # Print final Success Message
+                # Print final Success Message
 
-        correct_unames = set(pwd.getpwuid(int(correct_user))[0] for correct_user in correct_users)
-        print(f"Collaboration '{correct_unames}' granted access to resource '{resource_path}'.")
+                correct_unames = set(username_of(correct_user) for correct_user in correct_users)
+                print(f"Collaboration '{correct_unames}' granted access to resource '{resource_path}'.")
 
-        # Dump the network to the project file
-        dump_network_to_file(project_file, network)
+            # Dump the network to the project file
+            return dump_network_to_file(project_file, network)
 
     except FileNotFoundError as e:
         print(f"Error: Project {project_id} not found. {e}")
+        return False
 
     except Exception as e:
         # Print the exception type
@@ -450,6 +817,11 @@ def share(from_username: str, resource_id_to_share: str, to_usernames: set[str],
 
         # Print the error message
         print(f"Error message: {str(e)}")
+        return False
+
+    finally:
+        if acquired:
+            project_locks.release(project_file)
 
 
 def can_unshare(from_username: str, resource_id: str, to_username: str, project_id: str, resource_type: int) -> bool:
@@ -463,8 +835,8 @@ def can_unshare(from_username: str, resource_id: str, to_username: str, project_
     :return: Allow (True) or Deny (False)
     """
 
-    from_user_id = pwd.getpwnam(from_username).pw_uid
-    to_user_id = pwd.getpwnam(to_username).pw_uid
+    from_user_id = uid_of(from_username)
+    to_user_id = uid_of(to_username)
 
     # Step 0: self-share is not permitted
     if from_user_id == to_user_id:
@@ -489,15 +861,9 @@ def can_unshare(from_username: str, resource_id: str, to_username: str, project_
 
     # Computational Partition
     elif resource_type == 2:
-        # Run the scontrol show partition command and capture the output
-        result = subprocess.run(['scontrol', 'show', 'partition'], stdout=subprocess.PIPE, text=True)
-        output = result.stdout.splitlines()
-
-        for line in output:
-            if line.startswith('PartitionName='):
-                partition_name = line.split("=")[1]
-                if partition_name.startswith(from_username) and partition_name == resource_id:
-                    owner_uid = pwd.getpwnam(from_username).pw_uid
+        # Answered from the partitions fetched once per command
+        if get_slurm_partitions().is_owner(resource_id, from_username):
+            owner_uid = uid_of(from_username)
 
     # Step 2: Obtain the user list of the project
     # Define the base directory
@@ -507,40 +873,39 @@ def can_unshare(from_username: str, resource_id: str, to_username: str, project_
     project_file = os.path.join(base_dir, project_id) + ".json"
 
     try:
-        # Read all lines from the project file
-        with open(project_file, "r") as file:
-            data = json.load(file)
-            # network = Network(
-            #     usernames=set(data['all_user_ids']),
-            #     project_id=data['project_id'],
-            #     contexts={key: from_dict(context_data) for key, context_data in data["contexts"].items()}
-            # )
-
-            collaborators = data['all_user_ids']
-
-            # Check for the two constraints
-            if owner_uid != from_user_id:
-                print(f"Un-Sharing Error: The requesting user {from_username} is not the owner of the resource")
+        # Read the project file (snapshot and journal), whichever format it is stored in
+        network = open_network(project_file)
+        # network = Network(
+        #     usernames=set(data['all_user_ids']),
+        #     project_id=data['project_id'],
+        #     contexts={key: from_dict(context_data) for key, context_data in data["contexts"].items()}
+        # )
+
+        collaborators = network.get_all_user_ids()
+
+        # Check for the two constraints
+        if owner_uid != from_user_id:
+            print(f"Un-Sharing Error: The requesting user {from_username} is not the owner of the resource")
+            return False
+        else:
+            if (str(from_username) not in collaborators) or (str(to_username) not in collaborators):
+                print(
+                    f"Un-Sharing Error: {from_username} and {to_username} are not collaborators within {project_id}")
                 return False
             else:
-                if (str(from_username) not in collaborators) or (str(to_username) not in collaborators):
-                    print(
-                        f"Un-Sharing Error: {from_username} and {to_username} are not collaborators within {project_id}")
-                    return False
-                else:
-                    print(f"Un-Sharing {resource_path} Allowed: From {from_username} to {to_username}")
-                    return True
-                    # Check if the privilege has been previously shared or not!
-                    # for context_id, context in network.get_contexts().items():
-                    #     collaborators = context.get_users()
-                    #     if str(to_user_id) in collaborators and str(from_user_id) in collaborators:
-                    #         resources = context.get_resources()
-                    #         if (resource_type, resource_path) in resources:
-                    #             print(f"Un-Sharing {resource_path} Allowed: From {from_username} to {to_username}")
-                    #             return True
-                    #
-                    # print(f"Un-Sharing Error: {resource_path} was never shared with {to_username} within {project_id}")
-                    # return False
+                print(f"Un-Sharing {resource_path} Allowed: From {from_username} to {to_username}")
+                return True
+                # Check if the privilege has been previously shared or not!
+                # for context_id, context in network.get_contexts().items():
+                #     collaborators = context.get_users()
+                #     if str(to_user_id) in collaborators and str(from_user_id) in collaborators:
+                #         resources = context.get_resources()
+                #         if (resource_type, resource_path) in resources:
+                #             print(f"Un-Sharing {resource_path} Allowed: From {from_username} to {to_username}")
+                #             return True
+                #
+                # print(f"Un-Sharing Error: {resource_path} was never shared with {to_username} within {project_id}")
+                # return False
 
     except FileNotFoundError:
         print(f"Un-Sharing Error: Project {project_id} not found.")
@@ -550,16 +915,21 @@ def can_unshare(from_username: str, resource_id: str, to_username: str, project_
         return False
 
 
-def unshare(from_username: str, resource_id_to_unshare: str, to_usernames: set[str], project_id: str,
-            resource_type: int):
+@durability_scope()
+@slurm_updates.deferred()
+def unshare(from_username: str, resource_id_to_unshare, to_usernames: set[str], project_id: str,
+            resource_type: int, expand=True) -> bool:
     """
     This is the user action un-share that first authorizes the action with respect to can_unshare and then performs
     the un-share
+    Several resources may be un-shared at once, as with share()
     :param resource_type: type of the resource (1:file/directory, 2:computational partition)
     :param from_username: which user is requesting to un-share?
-    :param resource_id_to_unshare: what resource (privilege) is concerned?
+    :param resource_id_to_unshare: what resource (privilege) is concerned? a resource, a list or glob patterns of them
     :param to_usernames: to which users is it being un-shared?
     :param project_id: under which project context the sharing is taking place?
+    :param expand: expand glob patterns and resolve symbolic links (see expand_resources)
+    :return: True on success
     """
 
     # existing_allowed_groups = set()
@@ -568,13 +938,15 @@ def unshare(from_username: str, resource_id_to_unshare: str, to_usernames: set[s
     #     if not can_unshare(from_username, resource_id_to_unshare, to_username, project_id, resource_type):
     #         can_unshare_flag = False
 
+    resource_paths = expand_resources(resource_id_to_unshare, resource_type, expand=expand)
+
     can_unshare_flag = can_do_batch(
-        from_username, resource_id_to_unshare, list(to_usernames), project_id, resource_type
+        from_username, resource_paths, list(to_usernames), project_id, resource_type
     )
 
     if not can_unshare_flag:
         print("One of more (from_user, resource, to_user) un-sharing query is not permitted")
-        return
+        return False
 
     # Define the base directory
     base_dir = "/etc/project"
@@ -582,132 +954,107 @@ def unshare(from_username: str, resource_id_to_unshare: str, to_usernames: set[s
     # Create the full path for the project
     project_file = os.path.join(base_dir, project_id) + ".json"
 
-    # Get the directory path of the currently executing Python script
-    script_dir = os.path.dirname(os.path.realpath(__file__))
+    ldap_pool = get_ldap_pool()
+    acquired = False
+    try:
+        # Set up the ldap connection, borrowed for the whole operation: a failure to bind is reported like any other
+        # error, and a connection that failed is not handed back for reuse
+        with ldap_pool.connection() as conn:
+            from_user_id = str(uid_of(from_username))
+            to_user_ids = set(str(uid_of(to_username)) for to_username in to_usernames)
+
+            def unshare_in_network(network: Network) -> tuple:
+                # Unshare and Update the Collaboration Network, for every resource before any privilege is touched
+                # Also returns the first resource that was never shared, if any
+                unshares = []
+                for resource_path in resource_paths:
+                    already_shared_users, correct_users = (
+                        network.unshare_resource(from_user_id, resource_path, to_user_ids, resource_type))
+
+                    if already_shared_users is None:
+                        return unshares, resource_path
+
+                    unshares.append((resource_path, already_shared_users, correct_users))
+                return unshares, None
+
+            # Read the project file and compute the new network without holding the project, it is locked from here on
+            network, (unshares, never_shared_path) = open_network_for_update(project_file, unshare_in_network)
+            acquired = True
+
+            if never_shared_path is not None:
+                print(f"Un-Sharing Error: {never_shared_path} was never shared with one or many of {to_usernames} within {project_id}")
+                return False
 
-    # Construct the full path to the c wrappers
-    wrapper_supdate_path = os.path.join(script_dir, "wrapper_supdate")
+            # Add each new group (collaboration) the privileges contract to with its members, or the members to the
+            # existing group, once
+            correct_collaborations = {project_id + ''.join(sorted(correct_users)): correct_users
+                                      for _, _, correct_users in unshares if correct_users is not None}
+            for correct_context, correct_users in correct_collaborations.items():
+                if not ensure_collaboration_group(conn=conn, group_name=correct_context, user_ids=correct_users):
+                    # Nothing was granted yet, the project is left as it was
+                    print(f"Error: the collaboration group {correct_context} could not be set up.")
+                    return False
 
-    # Set up the ldap connection
-    conn = connect_to_ldap()
+            for resource_path, already_shared_users, correct_users in unshares:
 
-    try:
-        # Read all lines from the project file
-        with open(project_file, "r") as file:
-            data = json.load(file)
-            network = Network(
-                usernames=set(data['all_user_ids']),
-                project_id=data['project_id'],
-                contexts={key: from_dict(context_data) for key, context_data in data["contexts"].items()}
-            )
-
-        from_user_id = str(pwd.getpwnam(from_username).pw_uid)
-        to_user_ids = set(str(pwd.getpwnam(to_username).pw_uid) for to_username in to_usernames)
-
-        resource_path = resource_id_to_unshare
-        if resource_type == 1:
-            resource_path = os.path.abspath(resource_id_to_unshare)
+                # Construct the collaboration already enjoying the privileges and remove privileges
+                already_shared_context = project_id + ''.join(sorted(already_shared_users))
 
-        # Unshare and Update the Collaboration Network
-        already_shared_users, correct_users = (
-            network.unshare_resource(from_user_id, resource_path, to_user_ids, resource_type))
+                # The collaboration the privilege contracts to, if any
+                correct_context = None
+                if correct_users is not None:
+                    correct_context = project_id + ''.join(sorted(correct_users))
 
-        if already_shared_users is None:
-            print(f"Un-Sharing Error: {resource_path} was never shared with one or many of {to_usernames} within {project_id}")
-            return
+                print(resource_path)
+                # File/Directory
+                if resource_type == 1:
 
-        # Construct the collaboration already enjoying the privileges and remove privileges
-        already_shared_context = project_id + ''.join(sorted(already_shared_users))
+                    # Revoke the access and re-grant it to the correct group in one ACL update, through the whole tree
+                    # of a recursively shared directory
+                    update_resource_acl(resource_path,
+                                        grant_groups=[correct_context] if correct_context is not None else [],
+                                        revoke_groups=[already_shared_context],
+                                        recursive=network.is_recursive(resource_path, resource_type),
+                                        owner_uids={int(from_user_id)} if correct_context is not None else None)
+                    if correct_users is None:
+                        network.set_recursive(resource_path, resource_type, False)
 
-        print(resource_path)
-        # File/Directory
-        if resource_type == 1:
+                # Computational Partition
+                elif resource_type == 2:
 
-            if get_file_system(resource_path) == "nfs":
-                grp_id = grp.getgrnam(already_shared_context).gr_gid
-                subprocess.run(["nfs4_setfacl", "-x", f"A:g:{grp_id}:rxtcy", resource_path])
-            else:
-                subprocess.run(["setfacl", "-x", f"g:{already_shared_context}", resource_path])  # ext
+                    existing_allowed_groups = get_slurm_partitions().get_allow_groups(resource_path)  # ('grp_c')
 
-            subprocess.run(["sync"])
+                    existing_allowed_groups.remove(already_shared_context)
 
-        # Computational Partition
-        elif resource_type == 2:
+                    # Revoke the privileges
+                    slurm_updates.set_allow_groups(resource_path, existing_allowed_groups)
+
+                # Print the message of un-sharing the privileges
+                already_shared_unames = set(
+                    username_of(already_shared_uid) for already_shared_uid in already_shared_users)
+                print(f"Collaboration '{already_shared_unames}' removed access to resource '{resource_path}'.")
+
+                # Now perform the privilege-contraction and re-share privileges
+                if correct_users is not None:
 
-            result = subprocess.run(['scontrol', 'show', 'partition', resource_path],
-                                    stdout=subprocess.PIPE, text=True)
-            relevant_output = result.stdout.splitlines()[1]  # 'AllowGroups=grp_c AllowAccounts=ALL AllowQos=ALL'
-            relevant_config = relevant_output.split()[0]  # 'AllowGroups=grp_c'
-            existing_allowed_groups = set(relevant_config.split("=")[1].split(","))  # ('grp_c')
-
-            existing_allowed_groups.remove(already_shared_context)
-
-            # Revoke the privileges
-            correct_new_group = existing_allowed_groups
-            new_context = ','.join(correct_new_group)
-            subprocess.run([wrapper_supdate_path, resource_path, new_context])
-
-        # Print the message of un-sharing the privileges
-        already_shared_unames = set(
-            pwd.getpwuid(int(already_shared_uid))[0] for already_shared_uid in already_shared_users)
-        print(f"Collaboration '{already_shared_unames}' removed access to resource '{resource_path}'.")
-
-        # Now perform the privilege-contraction and re-share privileges
-        if correct_users is not None:
-            # Now assign to the correct context
-            correct_context = project_id + ''.join(sorted(correct_users))
-
-            group_exists, max_gid = group_exists_and_max_gid(group_name=correct_context)
-
-            # Add the new group if it doesn't exist
-            if not group_exists:
-                create_group(
-                    conn=conn,
-                    group_dn=f"cn={correct_context},ou=groups,dc=rc,dc=example,dc=org",
-                    group_name=correct_context,
-                    gid_number=max_gid + 1
-                )
-
-            # Assign users to the group
-            for user_id in correct_users:
-                user = pwd.getpwuid(int(user_id))[0]
-                add_user_to_group(
-                    conn=conn,
-                    group_dn=f"cn={correct_context},ou=groups,dc=rc,dc=example,dc=org",
-                    user_uid=user
-                )
-
-            # File/Directory
-            if resource_type == 1:
-
-                # Assign rwx access to the group in the ACL of the file
-                if get_file_system(resource_path) == "nfs":
-                    grp_id = grp.getgrnam(correct_context).gr_gid
-                    subprocess.run(["nfs4_setfacl", "-m", f"A:g:{grp_id}:RX", resource_path])
-                else:
-                    subprocess.run(["setfacl", "-m", f"g:{correct_context}:rwx", resource_path])
-
-                subprocess.run(["sync"])
-
-            # Computational Partition
-            elif resource_type == 2:
-
-                # Assign access to the group
-                correct_new_group = existing_allowed_groups
-                correct_new_group.add(correct_context)
-                new_context = ','.join(correct_new_group)
-                subprocess.run([wrapper_supdate_path, resource_path, new_context])
-
-            # Finally print the sharing message
-            correct_unames = set(
-                pwd.getpwuid(int(correct_uid))[0] for correct_uid in correct_users)
-            print(f"Collaboration '{correct_unames}' granted access to resource '{resource_path}'.")
-
-        # Dump the network to the project file
-        dump_network_to_file(project_file, network)
+                    # Computational Partition
+                    if resource_type == 2:
+
+                        # Assign access to the group
+                        existing_allowed_groups.add(correct_context)
+                        slurm_updates.set_allow_groups(resource_path, existing_allowed_groups)
+
+                    # Finally print the sharing message
+                    correct_unames = set(
+                        username_of(correct_uid) for correct_uid in correct_users)
+                    print(f"Collaboration '{correct_unames}' granted access to resource '{resource_path}'.")
+
+            # Dump the network to the project file
+            return dump_network_to_file(project_file, network)
 
     except FileNotFoundError:
         print(f"Error: Project {project_id} not found.")
+        return False
 
     except Exception as e:
         print(f"Error: {e}")
@@ -720,9 +1067,71 @@ def unshare(from_username: str, resource_id_to_unshare: str, to_usernames: set[s
 
         # Print the error message
         print(f"Error message: {str(e)}")
+        return False
 
+    finally:
+        if acquired:
+            project_locks.release(project_file)
 
-def remove_collaborator(project_id: str, users: set[str]):
+
+def apply_privilege_changes(changes: PrivilegeChanges, network: Network, conn) -> bool:
+    """
+    Bring the groups, ACLs and AllowGroups in line with a network, issuing only the net changes, per backend
+    :param changes: the changes computed by reconcile()
+    :param network: the network after the operation
+    :param conn: a bound LDAP connection
+    :return: False if a group could not be set up, nothing is changed then
+    """
+    # Step 1: the groups of the new collaborations, with their members, before they are granted anything
+    for group_name, user_ids in changes.get_groups_to_create().items():
+        if not ensure_collaboration_group(conn=conn, group_name=group_name, user_ids=user_ids):
+            print(f"Error: the collaboration group {group_name} could not be set up.")
+            return False
+
+    # Step 2: one ACL update per file/directory, the old group revoked and the new one granted at once
+    moves = changes.get_moves()
+    for resource_path, (grant_groups, revoke_groups) in sorted(changes.get_file_changes().items()):
+        # A resource is only granted to a context its owner (the sharer) belongs to
+        new_context_id = moves[(1, resource_path)][1]
+        owner_uids = None if new_context_id is None else \
+            set(int(uid) for uid in changes.get_users_after(new_context_id))
+        try:
+            update_resource_acl(resource_path, grant_groups=grant_groups, revoke_groups=revoke_groups,
+                                recursive=network.is_recursive(resource_path, 1), owner_uids=owner_uids)
+        except FileNotFoundError:
+            # Deleted since it was shared, nothing left to update: the other resources are still brought in line
+            print(f"Warning: '{resource_path}' no longer exists, skipped.")
+        if not grant_groups:
+            network.set_recursive(resource_path, 1, False)
+
+    # Step 3: one AllowGroups update per partition
+    partitions = get_slurm_partitions()
+    for partition, (allow_groups, disallow_groups) in sorted(changes.get_partition_changes().items()):
+        slurm_updates.set_allow_groups(partition,
+                                       (partitions.get_allow_groups(partition) - disallow_groups) | allow_groups)
+
+    for (_, resource_path), (old_context_id, new_context_id) in sorted(changes.get_moves().items()):
+        if old_context_id is not None:
+            old_unames = set(username_of(user_id) for user_id in changes.get_users_before(old_context_id))
+            print(f"Collaboration '{old_unames}' removed access to resource '{resource_path}'.")
+        if new_context_id is not None:
+            new_unames = set(username_of(user_id) for user_id in changes.get_users_after(new_context_id))
+            print(f"Collaboration '{new_unames}' granted access to resource '{resource_path}'.")
+
+    # Step 4: the groups of the collaborations that are gone, nothing refers to them anymore
+    for group in changes.get_groups_to_delete():
+        print(f"Candidate for Removal: {group}")
+        if delete_group(conn=conn, group_dn=f"cn={group},ou=groups,dc=rc,dc=example,dc=org"):
+            # Recycle the gid, the group's ACL entries and AllowGroups have been revoked above
+            gid_allocator.release(group)
+            forget_group(group)
+
+    return True
+
+
+@durability_scope()
+@slurm_updates.deferred()
+def remove_collaborator(project_id: str, users: set[str]) -> bool:
     """
     It is an administrative action to remove collaborators to a project
     :param project_id: The unique identifier to refer to the project
@@ -734,164 +1143,40 @@ def remove_collaborator(project_id: str, users: set[str]):
     # Create the full path for the project
     project_file = os.path.join(base_dir, project_id) + ".json"
 
-    # Get the directory path of the currently executing Python script
-    script_dir = os.path.dirname(os.path.realpath(__file__))
-
-    # Construct the full path to the c wrappers
-    wrapper_supdate_path = os.path.join(script_dir, "wrapper_supdate")
-
-    # Set up the LDAP connection
-    conn = connect_to_ldap()
-
+    ldap_pool = get_ldap_pool()
+    acquired = False
     try:
-        # Read all lines from the project file
-        with open(project_file, "r") as file:
-            data = json.load(file)
-            network = Network(
-                usernames=set(data['all_user_ids']),
-                project_id=data['project_id'],
-                contexts={key: from_dict(context_data) for key, context_data in data["contexts"].items()}
-            )
-
-        groups_to_delete = set()
-        user_groups_to_remove = set()
-        existing_allowed_groups = set()
-
-        for username in users:
-            user_id = pwd.getpwnam(username).pw_uid
-            privileges_to_update, contexts_to_delete = network.remove_user(user_id=str(user_id))
-
-            for context in contexts_to_delete:
-                group = project_id + ''.join(sorted(context))
-                groups_to_delete.add(group)
-                # Keep a note to remove the users from the group
-                for user_id in context:
-                    user_groups_to_remove.add((user_id, group))
-
-            print(f"{username}(uid={user_id}) successfully removed from {project_id}")
-
-            for resource_path, item in privileges_to_update.items():
-
-                resource_type = item["resource_type"]
-                already_shared_users = item["already_shared_users"]
-                correct_users = item["correct_users"]
-
-                # Construct the collaboration already enjoying the privileges and remove privileges
-                already_shared_context = project_id + ''.join(sorted(already_shared_users))
-
-                # File/Directory
-                if resource_type == 1:
-
-                    if get_file_system(resource_path) == "nfs":
-                        grp_id = grp.getgrnam(already_shared_context).gr_gid
-                        subprocess.run(["nfs4_setfacl", "-x", f"A:g:{grp_id}:rxtcy", resource_path])
-                    else:
-                        subprocess.run(["setfacl", "-x", f"g:{already_shared_context}", resource_path])  # ext
-
-                    subprocess.run(["sync"])
-
-                # Computational Partition
-                elif resource_type == 2:
-
-                    result = subprocess.run(['scontrol', 'show', 'partition', resource_path],
-                                            stdout=subprocess.PIPE, text=True)
-                    relevant_output = result.stdout.splitlines()[
-                        1]  # 'AllowGroups=grp_c AllowAccounts=ALL AllowQos=ALL'
-                    relevant_config = relevant_output.split()[0]  # 'AllowGroups=grp_c'
-                    existing_allowed_groups = set(relevant_config.split("=")[1].split(","))  # ('grp_c')
-
-                    existing_allowed_groups.remove(already_shared_context)
-
-                    # Revoke the privileges
-                    correct_new_group = existing_allowed_groups
-                    new_context = ','.join(correct_new_group)
-                    subprocess.run([wrapper_supdate_path, resource_path, new_context])
-
-                # Keep a note to remove the users from the group
-                for user_id in already_shared_users:
-                    user_groups_to_remove.add((user_id, already_shared_context))
-                    groups_to_delete.add(already_shared_context)
-
-                # Print the message of un-sharing the privileges
-                already_shared_unames = set(
-                    pwd.getpwuid(int(already_shared_uid))[0] for already_shared_uid in already_shared_users)
-                print(f"Collaboration '{already_shared_unames}' removed access to resource '{resource_path}'.")
-
-                # Now perform the privilege-contraction and re-share privileges
-                if correct_users is not None:
-                    # Now assign to the correct context
-                    correct_context = project_id + ''.join(sorted(correct_users))
-
-                    group_exists, max_gid = group_exists_and_max_gid(group_name=correct_context)
-
-                    # Add the new group if it doesn't exist
-                    if not group_exists:
-                        create_group(
-                            conn=conn,
-                            group_dn=f"cn={correct_context},ou=groups,dc=rc,dc=example,dc=org",
-                            group_name=correct_context,
-                            gid_number=max_gid + 1
-                        )
-
-                    # Assign users to the group
-                    for user_id in correct_users:
-                        user = pwd.getpwuid(int(user_id)).pw_name
-                        add_user_to_group(
-                            conn=conn,
-                            group_dn=f"cn={correct_context},ou=groups,dc=rc,dc=example,dc=org",
-                            user_uid=user
-                        )
-
-                    # File/Directory
-                    if resource_type == 1:
-
-                        # Assign rwx access to the group in the ACL of the file
-                        if get_file_system(resource_path) == "nfs":
-                            grp_id = grp.getgrnam(correct_context).gr_gid
-                            subprocess.run(["nfs4_setfacl", "-m", f"A:g:{grp_id}:RX", resource_path])
-                        else:
-                            subprocess.run(["setfacl", "-m", f"g:{correct_context}:rwx", resource_path])
-
-                        subprocess.run(["sync"])
-
-                    # Computational Partition
-                    elif resource_type == 2:
-
-                        # Assign access to the group
-                        correct_new_group = existing_allowed_groups
-                        correct_new_group.add(correct_context)
-                        new_context = ','.join(correct_new_group)
-                        subprocess.run([wrapper_supdate_path, resource_path, new_context])
-
-                    # Finally print the sharing message
-                    correct_unames = set(
-                        pwd.getpwuid(int(correct_uid))[0] for correct_uid in correct_users)
-                    print(f"Collaboration '{correct_unames}' granted access to resource '{resource_path}'.")
+        # Set up the LDAP connection, borrowed for the whole operation: a failure to bind is reported like any other
+        # error, and a connection that failed is not handed back for reuse
+        with ldap_pool.connection() as conn:
+            # Hold the project across its read-modify-write, concurrent operations on it queue here
+            project_locks.acquire(project_file)
+            acquired = True
+
+            # Read the project file (snapshot and journal), whichever format it is stored in
+            network = open_network(project_file)
+
+            # Resolve every collaborator once up front, the removal reports on most of them
+            prime_users(network.get_all_user_ids())
+
+            # The privileges before any user is removed
+            before = NetworkState(network)
+
+            # Remove all the users in one pass over the network
+            user_ids = {username: uid_of(username) for username in users}
+            network.remove_users(set(str(user_id) for user_id in user_ids.values()))
+            for username, user_id in user_ids.items():
+                print(f"{username}(uid={user_id}) successfully removed from {project_id}")
+
+            # Apply only the net difference with the final network, whatever the intermediate steps were
+            if not apply_privilege_changes(reconcile(before, network, project_id), network, conn):
+                return False
 
-        # Remove the user-group associations
-        # for user_id, group in user_groups_to_remove:
-        #     try:
-        #         print(f"Candidate for Removal: {user_id} from {group}")
-        #         user = pwd.getpwuid(int(user_id)).pw_name
-        #         remove_user_from_group(
-        #             conn=conn,
-        #             group_dn=f"cn={group},ou=groups,dc=rc,dc=example,dc=org",
-        #             user_uid=user
-        #         )
-        #     except KeyError:
-        #         print(f"User ID {user_id} not found")
-        #     except Exception as e:
-        #         print(f"Error: {e}")
-
-        # Delete the groups
-        for group in groups_to_delete:
-            print(f"Candidate for Removal: {group}")
-            delete_group(conn=conn, group_dn=f"cn={group},ou=groups,dc=rc,dc=example,dc=org")
-
-        dump_network_to_file(project_file, network)
+            return dump_network_to_file(project_file, network)
 
     except FileNotFoundError:
         print(f"Error: Project {project_id} not found.")
+        return False
     except Exception as e:
         print(f"Error: {e}")
         # Print the exception type
@@ -903,11 +1188,20 @@ def remove_collaborator(project_id: str, users: set[str]):
 
         # Print the error message
         print(f"Error message: {str(e)}")
+        return False
 
+    finally:
+        if acquired:
+            project_locks.release(project_file)
 
-def end_project(project_id: str):
+
+@durability_scope()
+@slurm_updates.deferred()
+def end_project(project_id: str) -> bool:
     """
     It is an administrative action to end a project
+    Every collaboration is torn down directly: its group is revoked from the ACLs and AllowGroups of its resources
+    and deleted, without any privilege contraction in between; the project file and journal are then archived
     :param project_id: The unique identifier to refer to the project
     """
 
@@ -917,18 +1211,82 @@ def end_project(project_id: str):
     # Create the full path for the project
     project_file = os.path.join(base_dir, project_id) + ".json"
 
+    ldap_pool = get_ldap_pool()
+    acquired = False
     try:
-        # Read all lines from the project file
-        with open(project_file, "r") as file:
-            data = json.load(file)
-            usernames = set(data['all_user_ids'])
-            remove_collaborator(project_id=project_id, users=set(usernames))
+        # Set up the LDAP connection, borrowed for the whole operation: a failure to bind is reported like any other
+        # error, and a connection that failed is not handed back for reuse
+        with ldap_pool.connection() as conn:
+            # Hold the project across its read-modify-write, concurrent operations on it queue here
+            project_locks.acquire(project_file)
+            acquired = True
+
+            # Read the project file (snapshot and journal), whichever format it is stored in
+            network = open_network(project_file)
 
-        # os.remove(project_file)
-        print(f"Project {project_id} ended successfully!")
+            # Resolve every collaborator once up front, the teardown reports on most of them
+            prime_users(network.get_all_user_ids())
+            context_masks = network.get_context_masks()
+
+            # Step 1: Revoke the group of each resource's context, one ACL update per file/directory
+            revoked_partition_groups: dict[str, set[str]] = dict()
+            for (resource_type, resource_path), context_id in sorted(network.get_placements().items()):
+                group = project_id + context_id
+
+                # File/Directory
+                if resource_type == 1:
+                    try:
+                        update_resource_acl(resource_path, revoke_groups=[group],
+                                            recursive=network.is_recursive(resource_path, resource_type))
+                    except FileNotFoundError:
+                        # Deleted since it was shared, nothing left to revoke: the teardown goes on
+                        print(f"Warning: '{resource_path}' no longer exists, skipped.")
+
+                # Computational Partition
+                elif resource_type == 2:
+                    revoked_partition_groups.setdefault(resource_path, set()).add(group)
+
+                already_shared_unames = set(
+                    username_of(user_id) for user_id in network.mask_to_users(context_masks[context_id]))
+                print(f"Collaboration '{already_shared_unames}' removed access to resource '{resource_path}'.")
+
+            # Step 2: One AllowGroups update per partition
+            partitions = get_slurm_partitions()
+            for partition, groups in revoked_partition_groups.items():
+                if partitions.exists(partition):
+                    slurm_updates.set_allow_groups(partition, partitions.get_allow_groups(partition) - groups)
+
+            # Step 3: Delete the group of every context, nothing refers to them anymore, the gids are recycled at once
+            with gid_allocator.transaction():
+                for context_id in sorted(context_masks.keys()):
+                    group = project_id + context_id
+                    print(f"Candidate for Removal: {group}")
+                    if delete_group(conn=conn, group_dn=f"cn={group},ou=groups,dc=rc,dc=example,dc=org"):
+                        gid_allocator.release(group)
+                        forget_group(group)
+
+            # Step 4: Archive the project file, its journal and its lock file, changes pending in a batch are written
+            # first
+            # Operations waiting on the lock find the project gone once it is released
+            if _batch_state.session is not None and not _batch_state.session.detach(project_file):
+                return False
+            archive_dir = os.path.join(base_dir, "archive")
+            archive_prefix = os.path.join(archive_dir, f"{project_id}.{time.strftime('%Y%m%d%H%M%S')}")
+            if not archive_project_file(project_file, archive_prefix + ".json"):
+                return False
+            journal_path = get_journal_path(project_file)
+            if os.path.exists(journal_path) and not archive_project_file(journal_path, archive_prefix + ".journal"):
+                return False
+            if not archive_project_file(get_lock_path(project_file), archive_prefix + ".lock"):
+                return False
+            project_store.forget(project_file)
+
+            print(f"Project {project_id} ended successfully!")
+            return True
 
     except FileNotFoundError:
         print(f"Error: Project {project_id} not found.")
+        return False
     except Exception as e:
         # Print the exception type
         print(f"Exception type: {type(e).__name__}")
@@ -939,3 +1297,8 @@ def end_project(project_id: str):
 
         # Print the error message
         print(f"Error message: {str(e)}")
+        return False
+
+    finally:
+        if acquired:
+            project_locks.release(project_file)
@@ -0,0 +1,228 @@
+#!/usr/bin/python3
+
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import traceback
+
+from utilities.client import DAEMON_SOCKET
+from utilities.collab import create_project, add_collaborator, remove_collaborator, share, unshare, end_project
+from utilities.identity import set_identity_ttl, username_of
+from utilities.slurm import get_slurm_partitions
+
+# Actions that require administrative privileges (the client must be root, i.e. run through sudo)
+ADMIN_ACTIONS = {"start", "add", "remove", "end"}
+
+# Identities can change in LDAP while the daemon runs, so cached resolutions expire
+IDENTITY_TTL = 300
+
+# A client has this many seconds to send its request, and a request may not be longer than this many bytes
+REQUEST_TIMEOUT = 10
+MAX_REQUEST_SIZE = 1 << 20
+
+
+class RequestOutput(io.TextIOBase):
+    """
+    Stands in for sys.stdout/sys.stderr in the daemon: what a thread prints while it serves a request goes to the
+    output of that request, whatever else is printed goes to the original stream
+    contextlib.redirect_stdout swaps the stream of the whole process, it cannot tell concurrent requests apart
+    """
+
+    def __init__(self, stream):
+        """
+        :param stream: the original stream
+        """
+        self.__stream = stream
+        self.__local = threading.local()
+
+    def __target(self):
+        output = getattr(self.__local, "output", None)
+        return output if output is not None else self.__stream
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        return self.__target().write(text)
+
+    def flush(self):
+        self.__target().flush()
+
+    @contextlib.contextmanager
+    def capturing(self, output: io.StringIO):
+        """
+        Send what the current thread prints to an output of its own
+        :param output: where the output of the current thread goes
+        """
+        self.__local.output = output
+        try:
+            yield
+        finally:
+            self.__local.output = None
+
+
+# Installed as sys.stdout/sys.stderr by serve()
+request_stdout = RequestOutput(sys.stdout)
+request_stderr = RequestOutput(sys.stderr)
+
+
+def execute_request(request: dict) -> bool:
+    """
+    Perform one CLEARS action, either in-process for the CLI or on behalf of a daemon client
+    :param request: the action and its parameters (project, users, resource, type, owner, recursive, expand)
+    :return: True if the action succeeded
+    """
+    action = request["action"]
+    project_id = request.get("project")
+    users = set(request.get("users") or [])
+    resource = request.get("resource")
+    resource_type = request.get("type")
+    from_user = request.get("owner")
+
+    if action == "start":
+        return create_project(project_id=project_id)
+    elif action == "add":
+        return add_collaborator(project_id, users)
+    elif action == "remove":
+        return remove_collaborator(project_id, users)
+    elif action == "end":
+        return end_project(project_id=project_id)
+    elif action == "share":
+        return share(from_username=from_user, resource_id_to_share=resource,
+                     to_usernames=users, project_id=project_id, resource_type=resource_type,
+                     recursive=bool(request.get("recursive", False)), expand=bool(request.get("expand", True)))
+    elif action == "unshare":
+        return unshare(from_username=from_user, resource_id_to_unshare=resource,
+                       to_usernames=users, project_id=project_id, resource_type=resource_type,
+                       expand=bool(request.get("expand", True)))
+    else:
+        print(f"Unknown action '{action}'")
+        return False
+
+
+def get_peer_uid(connection: socket.socket) -> int:
+    """
+    Identify the client of a Unix domain socket connection from the kernel, not from what it claims
+    :param connection: the accepted connection
+    :return: the uid of the connecting process
+    """
+    credentials = connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _pid, uid, _gid = struct.unpack("3i", credentials)
+    return uid
+
+
+def authorize_request(request: dict, peer_uid: int) -> bool:
+    """
+    Bind a client request to the identity of the client
+    :param request: the action and its parameters, the owner is overwritten for non-root clients
+    :param peer_uid: the uid of the connecting process
+    :return: True if the client may perform the action
+    """
+    if request["action"] in ADMIN_ACTIONS:
+        if peer_uid != 0:
+            print(f"{request['action']}: This action can only be performed with Administrative Privileges.")
+            return False
+        return True
+
+    # Regular users always act as themselves, only root may act on behalf of an owner (non-interactive mode)
+    if peer_uid != 0 or not request.get("owner"):
+        request["owner"] = username_of(peer_uid)
+    return True
+
+
+class ClearsRequestHandler(socketserver.StreamRequestHandler):
+
+    # Applied to the connection socket, a client that stops sending (or reading) is dropped
+    timeout = REQUEST_TIMEOUT
+
+    def read_request(self) -> dict:
+        """
+        Read the request line of the client, bounded in size and time
+        :return: the request
+        """
+        line = self.rfile.readline(MAX_REQUEST_SIZE + 1)
+        if len(line) > MAX_REQUEST_SIZE:
+            raise ValueError(f"Requests are limited to {MAX_REQUEST_SIZE} bytes")
+        request = json.loads(line.decode("utf-8"))
+        if not isinstance(request, dict):
+            raise ValueError("A request must be a JSON object")
+        return request
+
+    def handle(self):
+        output = io.StringIO()
+        status = "ok"
+
+        try:
+            request = self.read_request()
+            peer_uid = get_peer_uid(self.connection)
+            # The client expanded the patterns of regular users with their own credentials, the daemon does not
+            # probe paths on their behalf
+            request["expand"] = peer_uid == 0
+        except (OSError, ValueError) as e:
+            # Timed out, oversized or malformed: answered without waiting for the other clients
+            request = None
+            status = "error"
+            output.write(f"Invalid request: {e}\n")
+
+        if request is not None:
+            # Requests run concurrently: operations on the same project queue on its lock, the state of a command
+            # (batched writes, durability barriers, AllowGroups updates, partitions) is kept per thread
+            with request_stdout.capturing(output), request_stderr.capturing(output):
+                try:
+                    # Partitions are fetched at most once per request, and afresh for each one
+                    get_slurm_partitions().invalidate()
+
+                    if authorize_request(request, peer_uid):
+                        if not execute_request(request):
+                            status = "failed"
+                    else:
+                        status = "denied"
+                except Exception as e:
+                    status = "error"
+                    print(f"Exception type: {type(e).__name__}")
+                    traceback.print_exc()
+                    print(f"Error message: {str(e)}")
+
+        response = {"status": status, "output": output.getvalue()}
+        with contextlib.suppress(OSError):
+            self.wfile.write(json.dumps(response).encode("utf-8"))
+
+
+class ClearsServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    # One thread per connection, so a slow client never holds up the others
+    daemon_threads = True
+
+
+def serve(socket_path=DAEMON_SOCKET):
+    """
+    Run the resident CLEARS daemon: parsed projects, identity resolutions and imported modules stay warm,
+    and every CLI invocation is served over a Unix domain socket
+    Connections are served concurrently, and so are the actions, but for those on the same project
+    :param socket_path: where to listen
+    """
+    if os.geteuid() != 0:
+        print("daemon: This action can only be performed with Administrative Privileges.")
+        return
+
+    set_identity_ttl(IDENTITY_TTL)
+    sys.stdout, sys.stderr = request_stdout, request_stderr
+
+    # Remove a stale socket left behind by a previous daemon
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(socket_path)
+
+    with ClearsServer(socket_path, ClearsRequestHandler) as server:
+        # Every user may connect, each request is authorized against the kernel-reported peer uid
+        os.chmod(socket_path, 0o666)
+        print(f"CLEARS daemon listening on {socket_path}")
+        try:
+            server.serve_forever()
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(socket_path)
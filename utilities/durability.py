@@ -0,0 +1,126 @@
+import ctypes
+import ctypes.util
+import os
+import threading
+from contextlib import contextmanager
+
+# Past this many changed files on one file system, a single syncfs is cheaper than an fsync per file
+SYNCFS_THRESHOLD = 16
+
+
+class _DurabilityState(threading.local):
+    # Kept per thread: each command served by the daemon flushes its own changes when its own scope ends
+
+    def __init__(self):
+        # Changed files/directories whose changes (ACLs) must reach stable storage before the current command
+        # completes, (device, inode) -> a descriptor of the file kept open until the flush: nothing is reopened by
+        # name, so a path swapped for a FIFO or a symbolic link meanwhile is never opened by the (privileged) flush
+        self.pending: dict[tuple, int] = dict()
+        # Devices whose whole file system must reach stable storage (too many changed files to track one by one),
+        # device -> a descriptor of any file/directory on it
+        self.pending_file_systems: dict[int, int] = dict()
+        self.depth = 0
+
+
+_state = _DurabilityState()
+
+
+def _load_syncfs():
+    # syncfs(2) is not exposed by the os module
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        return libc.syncfs
+    except (OSError, AttributeError, TypeError):
+        return None
+
+
+_syncfs = _load_syncfs()
+
+
+def _sync_file_system(fd: int):
+    if _syncfs is None or _syncfs(fd) != 0:
+        os.sync()
+
+
+def flush():
+    """
+    Make every pending change durable: one fsync per changed inode, or one syncfs per file system when many
+    of its files changed
+    """
+    file_systems = sorted(_state.pending_file_systems.items())
+    _state.pending_file_systems.clear()
+    files = sorted(_state.pending.items())
+    _state.pending.clear()
+
+    synced_devices = set()
+    for device, fd in file_systems:
+        try:
+            _sync_file_system(fd)
+            synced_devices.add(device)
+        except OSError as e:
+            print(f"Warning: could not flush device {device}: {e}")
+        finally:
+            os.close(fd)
+
+    for (device, inode), fd in files:
+        try:
+            if device not in synced_devices:
+                os.fsync(fd)
+        except OSError as e:
+            print(f"Warning: could not flush inode {inode} of device {device}: {e}")
+        finally:
+            os.close(fd)
+
+
+def require_durable(fd: int):
+    """
+    Register a file/directory whose metadata changed
+    Within a durability scope the flush is deferred to the end of the outermost scope, otherwise it is immediate
+    Past SYNCFS_THRESHOLD files on one file system, the file system is flushed as a whole instead
+    :param fd: an open descriptor of the changed file/directory, duplicated (the caller keeps its own)
+    """
+    pending = _state.pending
+    metadata = os.fstat(fd)
+    key = (metadata.st_dev, metadata.st_ino)
+    if metadata.st_dev not in _state.pending_file_systems and key not in pending:
+        pending[key] = os.dup(fd)
+        device_keys = [pending_key for pending_key in pending if pending_key[0] == metadata.st_dev]
+        if len(device_keys) > SYNCFS_THRESHOLD:
+            # Only one descriptor per file system is kept open from here on
+            _state.pending_file_systems[metadata.st_dev] = pending.pop(device_keys[0])
+            for pending_key in device_keys[1:]:
+                os.close(pending.pop(pending_key))
+    if _state.depth == 0:
+        flush()
+
+
+def require_durable_file_system(fd: int):
+    """
+    Register a whole tree whose metadata changed, flushed with one syncfs of its file system
+    Within a durability scope the flush is deferred to the end of the outermost scope, otherwise it is immediate
+    :param fd: an open descriptor of any file/directory of the file system, duplicated (the caller keeps its own)
+    """
+    pending = _state.pending
+    device = os.fstat(fd).st_dev
+    if device not in _state.pending_file_systems:
+        _state.pending_file_systems[device] = os.dup(fd)
+        for pending_key in [pending_key for pending_key in pending if pending_key[0] == device]:
+            os.close(pending.pop(pending_key))
+    if _state.depth == 0:
+        flush()
+
+
+@contextmanager
+def durability_scope():
+    """
+    Coalesce the durability barriers of a whole command into a single flush when the outermost scope ends
+    Scopes nest, and may also decorate a function (@durability_scope())
+    Scopes are per thread, a thread only flushes the changes it registered
+    """
+    _state.depth += 1
+    try:
+        yield
+    finally:
+        _state.depth -= 1
+        if _state.depth == 0:
+            flush()
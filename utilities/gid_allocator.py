@@ -0,0 +1,203 @@
+import fcntl
+import json
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+# The gid range reserved for CLEARS collaboration groups
+GID_MIN = 10001
+GID_MAX = 19999
+
+# Seconds a freed gid stays unused: ACL entries of the deleted group that were missed (e.g. on a file system that was
+# offline) must not grant a new group access
+GID_QUARANTINE = 30 * 24 * 3600
+
+
+def scan_nss_groups(gid_min=GID_MIN, gid_max=GID_MAX) -> dict:
+    """
+    Enumerate the groups known to NSS within the gid range, used once to seed the allocator
+    :param gid_min: lowest gid of the range
+    :param gid_max: highest gid of the range
+    :return: group name -> gid
+    """
+    groups = dict()
+    try:
+        output = subprocess.check_output(['getent', 'group']).decode('utf-8')
+    except subprocess.CalledProcessError:
+        return groups
+
+    for line in output.strip().split('\n'):
+        parts = line.split(':')
+        if len(parts) > 2 and parts[2].isdigit() and gid_min <= int(parts[2]) <= gid_max:
+            groups[parts[0]] = int(parts[2])
+    return groups
+
+
+class GidAllocator:
+    """
+    Tracks the CLEARS gid range persistently: which group holds which gid, and which gids were freed for reuse
+    Existence checks are dict lookups, and allocations are atomic across processes (flock on a lock file)
+    Freed gids are reused only once the range is exhausted, oldest freed first, and never within their quarantine
+    """
+
+    def __init__(self, state_file: str, writer, gid_min=GID_MIN, gid_max=GID_MAX, quarantine=GID_QUARANTINE):
+        """
+        :param state_file: where the allocator state is persisted, e.g. /etc/project/.gid_allocator.json
+        :param writer: callable (path, content: bytes, append) writing a file within /etc/project (the privileged
+                       wrapper)
+        :param gid_min: lowest gid of the range
+        :param gid_max: highest gid of the range
+        :param quarantine: seconds a freed gid stays unused
+        """
+        self.__state_file = state_file
+        self.__lock_file = os.path.splitext(state_file)[0] + ".lock"
+        self.__writer = writer
+        self.__gid_min = gid_min
+        self.__gid_max = gid_max
+        self.__quarantine = quarantine
+
+        self.__state = None
+        self.__dirty = False
+        self.__failed = False
+        self.__depth = 0
+        self.__lock_fd = None
+        # Held by the thread inside a transaction: the threads of the daemon share the state, and take turns on it
+        self.__thread_lock = threading.RLock()
+
+    def __load(self) -> dict:
+        try:
+            with open(self.__state_file, "r") as file:
+                state = json.load(file)
+            # Gids freed before they were quarantined are [gid, 0]: released long ago
+            state["free"] = [entry if isinstance(entry, list) else [entry, 0] for entry in state["free"]]
+            return state
+        except FileNotFoundError:
+            # First use: seed from the groups already present in the range
+            groups = scan_nss_groups(self.__gid_min, self.__gid_max)
+            self.__dirty = True
+            return {
+                "groups": groups,
+                "free": [],
+                "next": max(groups.values(), default=self.__gid_min - 1) + 1,
+            }
+
+    @contextmanager
+    def transaction(self):
+        """
+        Hold the allocator lock across several lookups/allocations, the state is written back once at the end
+        Transactions nest, only the outermost one locks and writes; the threads of a process queue on the outermost
+        If an exception leaves any of them, nothing is written: e.g. a gid allocated for a group whose creation failed
+        is not kept
+        """
+        with self.__thread_lock:
+            if self.__depth == 0:
+                # The lock file is created once by the privileged writer (appending, so a lock file created meanwhile by
+                # another process is kept), everybody may lock it read-only
+                if not os.path.exists(self.__lock_file):
+                    self.__writer(self.__lock_file, b"", append=True)
+                self.__lock_fd = os.open(self.__lock_file, os.O_RDONLY)
+                fcntl.flock(self.__lock_fd, fcntl.LOCK_EX)
+                self.__state = self.__load()
+                self.__failed = False
+
+            self.__depth += 1
+            try:
+                yield self
+            except BaseException:
+                self.__failed = True
+                raise
+            finally:
+                self.__depth -= 1
+                if self.__depth == 0:
+                    try:
+                        if self.__dirty and not self.__failed:
+                            self.__writer(self.__state_file, json.dumps(self.__state).encode("utf-8"))
+                    finally:
+                        self.__state = None
+                        self.__dirty = False
+                        self.__failed = False
+                        fcntl.flock(self.__lock_fd, fcntl.LOCK_UN)
+                        os.close(self.__lock_fd)
+                        self.__lock_fd = None
+
+    def lookup(self, group_name: str):
+        """
+        Check whether a group exists
+        :param group_name: name of the group
+        :return: its gid, or None if the group is unknown
+        """
+        with self.transaction():
+            return self.__state["groups"].get(group_name)
+
+    def allocate(self, group_name: str) -> int:
+        """
+        Assign a gid to a new group, a never used one first, then the gid freed the longest ago past its quarantine
+        :param group_name: name of the group
+        :return: the gid (the existing one if the group is already known)
+        """
+        with self.transaction():
+            groups = self.__state["groups"]
+            if group_name in groups:
+                return groups[group_name]
+
+            free = self.__state["free"]
+            # Gids recorded for groups created outside of the allocator are skipped
+            used = set(groups.values())
+            while self.__state["next"] in used:
+                self.__state["next"] += 1
+            if self.__state["next"] <= self.__gid_max:
+                gid = self.__state["next"]
+                self.__state["next"] += 1
+            elif free and free[0][1] + self.__quarantine <= time.time():
+                gid = free.pop(0)[0]
+            else:
+                raise RuntimeError(f"The CLEARS gid range {self.__gid_min}-{self.__gid_max} is exhausted")
+
+            groups[group_name] = gid
+            self.__dirty = True
+            return gid
+
+    def release(self, group_name: str):
+        """
+        Forget a deleted group and make its gid available again, once its quarantine is over
+        :param group_name: name of the group
+        """
+        with self.transaction():
+            gid = self.__state["groups"].pop(group_name, None)
+            if gid is not None:
+                # Kept in the order they were freed
+                self.__state["free"].append([gid, int(time.time())])
+                self.__dirty = True
+
+    def cancel(self, group_name: str):
+        """
+        Undo the allocation of a group that was never created, its gid was never used and is reusable at once
+        :param group_name: name of the group
+        """
+        with self.transaction():
+            gid = self.__state["groups"].pop(group_name, None)
+            if gid is None:
+                return
+            if gid == self.__state["next"] - 1:
+                self.__state["next"] = gid
+            else:
+                # Released "long ago": no quarantine
+                self.__state["free"].insert(0, [gid, 0])
+            self.__dirty = True
+
+    def record(self, group_name: str, gid: int):
+        """
+        Record the gid of a group that exists outside of the allocator's knowledge (e.g. created before the allocator
+        was seeded), in place of any gid allocated for it
+        :param group_name: name of the group
+        :param gid: its actual gid
+        """
+        with self.transaction():
+            if self.__state["groups"].get(group_name) == gid:
+                return
+            self.cancel(group_name)
+            self.__state["free"] = [entry for entry in self.__state["free"] if entry[0] != gid]
+            self.__state["groups"][group_name] = gid
+            self.__dirty = True
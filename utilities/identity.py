@@ -0,0 +1,145 @@
+import grp
+import pwd
+import time
+
+
+class IdentityCache:
+    """
+    A per-invocation memo of uid <-> username and group name -> gid resolutions
+    Every NSS lookup (possibly served by LDAP/SSSD) is paid at most once per entry, optionally bounded by a TTL
+    """
+
+    def __init__(self, ttl=None):
+        # Time-to-live of an entry in seconds, None keeps entries for the lifetime of the process
+        self.__ttl = ttl
+        self.__uid_by_name: dict[str, tuple[int, float]] = dict()
+        self.__name_by_uid: dict[int, tuple[str, float]] = dict()
+        self.__gid_by_group: dict[str, tuple[int, float]] = dict()
+
+    def set_ttl(self, ttl):
+        self.__ttl = ttl
+
+    def clear(self):
+        self.__uid_by_name.clear()
+        self.__name_by_uid.clear()
+        self.__gid_by_group.clear()
+
+    def __lookup(self, table: dict, key):
+        entry = table.get(key)
+        if entry is None:
+            return None
+        value, cached_at = entry
+        if self.__ttl is not None and time.monotonic() - cached_at > self.__ttl:
+            # Another thread may have dropped it already
+            table.pop(key, None)
+            return None
+        return value
+
+    def __remember_user(self, username: str, uid: int):
+        now = time.monotonic()
+        self.__uid_by_name[username] = (uid, now)
+        self.__name_by_uid[uid] = (username, now)
+
+    def uid_of(self, username: str) -> int:
+        uid = self.__lookup(self.__uid_by_name, username)
+        if uid is None:
+            uid = pwd.getpwnam(username).pw_uid
+            self.__remember_user(username, uid)
+        return uid
+
+    def username_of(self, uid) -> str:
+        uid = int(uid)
+        username = self.__lookup(self.__name_by_uid, uid)
+        if username is None:
+            username = pwd.getpwuid(uid).pw_name
+            self.__remember_user(username, uid)
+        return username
+
+    def gid_of(self, group_name: str) -> int:
+        gid = self.__lookup(self.__gid_by_group, group_name)
+        if gid is None:
+            gid = grp.getgrnam(group_name).gr_gid
+            self.remember_group(group_name, gid)
+        return gid
+
+    def remember_group(self, group_name: str, gid: int):
+        # Record a gid known from elsewhere (e.g. a group just created), so NSS is not asked for it
+        self.__gid_by_group[group_name] = (gid, time.monotonic())
+
+    def forget_group(self, group_name: str):
+        self.__gid_by_group.pop(group_name, None)
+
+    def prime_users(self, users):
+        """
+        Resolve a batch of users up front so that later lookups within the invocation are served from memory
+        :param users: usernames and/or uids (int or numeric strings)
+        """
+        for user in users:
+            if isinstance(user, int) or str(user).isdigit():
+                self.username_of(int(user))
+            else:
+                self.uid_of(user)
+
+
+# The process-wide cache used by every CLEARS module
+_cache = IdentityCache()
+
+
+def uid_of(username: str) -> int:
+    """
+    Resolve a username to its uid
+    :param username: the username
+    :return: the uid, raises KeyError for unknown users (as pwd does)
+    """
+    return _cache.uid_of(username)
+
+
+def username_of(uid) -> str:
+    """
+    Resolve a uid to its username
+    :param uid: the uid (int or numeric string)
+    :return: the username, raises KeyError for unknown uids (as pwd does)
+    """
+    return _cache.username_of(uid)
+
+
+def gid_of(group_name: str) -> int:
+    """
+    Resolve a group name to its gid
+    :param group_name: the group name
+    :return: the gid, raises KeyError for unknown groups (as grp does)
+    """
+    return _cache.gid_of(group_name)
+
+
+def to_uid(user) -> int:
+    """
+    Normalize a user given either as a uid (int or numeric string) or as a username
+    :param user: the uid or username
+    :return: the uid
+    """
+    if isinstance(user, int):
+        return user
+    if user.isdigit():
+        return int(user)
+    return uid_of(user)
+
+
+def remember_group(group_name: str, gid: int):
+    _cache.remember_group(group_name, gid)
+
+
+def forget_group(group_name: str):
+    _cache.forget_group(group_name)
+
+
+def prime_users(users):
+    _cache.prime_users(users)
+
+
+def set_identity_ttl(ttl):
+    _cache.set_ttl(ttl)
+
+
+def clear_identity_cache():
+    _cache.clear()
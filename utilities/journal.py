@@ -0,0 +1,71 @@
+import json
+import os
+
+from classes.collab import Network
+
+# Once the journal grows past this size, the next write folds it into a fresh snapshot of the project file
+JOURNAL_COMPACTION_THRESHOLD = 512 * 1024
+
+
+def get_journal_path(project_file: str) -> str:
+    """
+    The append-only mutation journal kept next to a project file
+    :param project_file: path of the project file (the snapshot)
+    :return: path of the journal, e.g. /etc/project/Project1.journal
+    """
+    return os.path.splitext(project_file)[0] + ".journal"
+
+
+def encode_mutations(mutations: list) -> bytes:
+    """
+    Serialize mutation records as journal lines
+    :param mutations: the mutation records, as drained from the Network
+    :return: one JSON record per line
+    """
+    return "".join(json.dumps(mutation) + "\n" for mutation in mutations).encode("utf-8")
+
+
+def read_journal(project_file: str) -> list:
+    """
+    Read back every complete mutation record of a project journal
+    :param project_file: path of the project file
+    :return: the mutation records in journal order
+    """
+    mutations = []
+    try:
+        with open(get_journal_path(project_file), "r") as file:
+            for line in file:
+                # A torn trailing line (interrupted append) carries no committed mutation
+                if not line.endswith("\n"):
+                    break
+                mutations.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return mutations
+
+
+def replay_journal(network: Network, mutations: list):
+    """
+    Re-apply the journaled mutations not yet folded into the snapshot the network was loaded from
+    :param network: the network loaded from the snapshot
+    :param mutations: the mutation records read from the journal
+    """
+    for mutation in mutations:
+        if mutation["seq"] > network.get_journal_seq():
+            network.apply_mutation(mutation)
+
+
+def needs_compaction(project_file: str, pending_size: int) -> bool:
+    """
+    Decide whether the next write should be a full snapshot instead of a journal append
+    :param project_file: path of the project file
+    :param pending_size: size in bytes of the records about to be appended
+    :return: True if there is no snapshot yet or the journal would pass the compaction threshold
+    """
+    if not os.path.exists(project_file):
+        return True
+    try:
+        journal_size = os.path.getsize(get_journal_path(project_file))
+    except FileNotFoundError:
+        journal_size = 0
+    return journal_size + pending_size > JOURNAL_COMPACTION_THRESHOLD
@@ -0,0 +1,94 @@
+import os
+import re
+import select
+import threading
+
+MOUNTINFO = "/proc/self/mountinfo"
+
+# NFS is reported as "nfs" whatever its version, the same as `stat -f -c %T` does
+FILE_SYSTEM_ALIASES = {"nfs4": "nfs"}
+
+
+def unescape_mount_path(path: str) -> str:
+    # The kernel escapes space, tab, newline and backslash in mount points as \ooo octal sequences
+    return re.sub(r"\\([0-7]{3})", lambda match: chr(int(match.group(1), 8)), path)
+
+
+def parse_mountinfo(content: str) -> dict:
+    """
+    Parse the mount table of the process
+    :param content: content of /proc/self/mountinfo
+    :return: mount point -> file system type (the last mount stacked on a mount point wins)
+    """
+    mount_points = dict()
+    for line in content.splitlines():
+        fields = line.split()
+        if " - " not in line or len(fields) < 5:
+            continue
+        # Optional fields end at the "-" separator, the file system type follows it
+        separator = fields.index("-", 6)
+        file_system = fields[separator + 1]
+        mount_points[unescape_mount_path(fields[4])] = FILE_SYSTEM_ALIASES.get(file_system, file_system)
+    return mount_points
+
+
+class MountTable:
+    """
+    Resolves the file system of a path in-process, from a longest-prefix index over the mount table
+    The table is parsed once and re-parsed only when the kernel signals a mount table change
+    Lookups may come from several threads (the daemon), they take turns on the table
+    """
+
+    def __init__(self, mountinfo=MOUNTINFO):
+        self.__mountinfo = mountinfo
+        self.__file = None
+        self.__poller = None
+        self.__mount_points: dict[str, str] = dict()
+        self.__resolved: dict[str, str] = dict()
+        self.__lock = threading.Lock()
+
+    def __refresh(self):
+        # The kernel flags the open mountinfo file with POLLPRI/POLLERR whenever the mount table changes
+        if self.__file is not None:
+            if not self.__poller.poll(0):
+                return
+            self.__file.seek(0)
+        else:
+            self.__file = open(self.__mountinfo, "r")
+            self.__poller = select.poll()
+            self.__poller.register(self.__file, select.POLLPRI | select.POLLERR)
+
+        self.__mount_points = parse_mountinfo(self.__file.read())
+        self.__resolved.clear()
+
+    def get_file_system(self, path: str) -> str:
+        """
+        Obtain the file system type of a file/directory
+        :param path: path of the file/directory
+        :return: file system type, e.g. "nfs" or "ext4"
+        """
+        path = os.path.realpath(path)
+
+        with self.__lock:
+            self.__refresh()
+
+            file_system = self.__resolved.get(path)
+            if file_system is not None:
+                return file_system
+
+            # Longest prefix: walk up from the path until a mount point is met
+            mount_point = path
+            while mount_point not in self.__mount_points and mount_point != "/":
+                mount_point = os.path.dirname(mount_point)
+
+            file_system = self.__mount_points.get(mount_point)
+            self.__resolved[path] = file_system
+            return file_system
+
+
+# The process-wide mount table
+_mount_table = MountTable()
+
+
+def get_file_system_type(path: str) -> str:
+    return _mount_table.get_file_system(path)
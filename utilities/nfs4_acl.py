@@ -0,0 +1,177 @@
+import errno
+import os
+import struct
+import subprocess
+
+from utilities.identity import gid_of
+
+# The system.nfs4_acl extended attribute holds the ACL in its XDR (RFC 7530) encoding
+NFS4_ACL = "system.nfs4_acl"
+
+XDR_UINT = struct.Struct(">I")
+XDR_ACE = struct.Struct(">III")  # type, flag, access mask, followed by the who string
+
+ACE4_ACCESS_ALLOWED_ACE_TYPE = 0
+ACE4_ACCESS_DENIED_ACE_TYPE = 1
+
+ACE4_FILE_INHERIT_ACE = 0x1
+ACE4_DIRECTORY_INHERIT_ACE = 0x2
+ACE4_IDENTIFIER_GROUP = 0x40
+
+# Access mask bits, by their nfs4_setfacl letter
+ACE4_PERMISSIONS = {
+    "r": 0x1,  # read data / list directory
+    "w": 0x2,  # write data / add file
+    "a": 0x4,  # append data / add subdirectory
+    "n": 0x8,  # read named attributes
+    "N": 0x10,  # write named attributes
+    "x": 0x20,  # execute
+    "D": 0x40,  # delete child
+    "t": 0x80,  # read attributes
+    "T": 0x100,  # write attributes
+    "d": 0x10000,  # delete
+    "c": 0x20000,  # read ACL
+    "C": 0x40000,  # write ACL
+    "o": 0x80000,  # write owner
+    "y": 0x100000,  # synchronize
+}
+
+# nfs4_setfacl's generic permissions
+ACE4_GENERIC_PERMISSIONS = {"R": "rntcy", "W": "watTNcCy", "X": "xtcy"}
+
+ACE4_TYPES = {"A": ACE4_ACCESS_ALLOWED_ACE_TYPE, "D": ACE4_ACCESS_DENIED_ACE_TYPE, "U": 2, "L": 3}
+ACE4_FLAGS = {"f": ACE4_FILE_INHERIT_ACE, "d": ACE4_DIRECTORY_INHERIT_ACE, "n": 0x4, "i": 0x8, "S": 0x10,
+              "F": 0x20, "g": ACE4_IDENTIFIER_GROUP}
+
+
+def parse_access_mask(permissions: str) -> int:
+    """
+    Convert nfs4_setfacl permissions into an access mask
+    :param permissions: e.g. "RX" or "rxtcy"
+    :return: the access mask
+    """
+    mask = 0
+    for letter in permissions:
+        for permission in ACE4_GENERIC_PERMISSIONS.get(letter, letter):
+            mask |= ACE4_PERMISSIONS.get(permission, 0)
+    return mask
+
+
+def format_ace(ace: tuple) -> str:
+    # The nfs4_setfacl text of an ACE, e.g. "A:g:10001:rxtcy"
+    ace_type, flag, mask, who = ace
+    type_letter = next(letter for letter, value in ACE4_TYPES.items() if value == ace_type)
+    flag_letters = "".join(letter for letter, value in ACE4_FLAGS.items() if flag & value)
+    permission_letters = "".join(letter for letter, value in ACE4_PERMISSIONS.items() if mask & value)
+    return f"{type_letter}:{flag_letters}:{who}:{permission_letters}"
+
+
+def parse_ace(text: str) -> tuple:
+    # The ACE of an nfs4_getfacl line, e.g. "A:g:group@example.org:rxtcy"
+    type_letter, flag_letters, rest = text.split(":", 2)
+    who, permission_letters = rest.rsplit(":", 1)
+    flag = 0
+    for letter in flag_letters:
+        flag |= ACE4_FLAGS.get(letter, 0)
+    return ACE4_TYPES[type_letter], flag, parse_access_mask(permission_letters), who
+
+
+def decode_acl(data: bytes) -> list:
+    """
+    Decode the XDR encoding of an NFSv4 ACL
+    :param data: the raw attribute value
+    :return: the ACEs in order, as (type, flag, access mask, who)
+    """
+    (count,) = XDR_UINT.unpack_from(data, 0)
+    offset = XDR_UINT.size
+    aces = []
+    for _ in range(count):
+        ace_type, flag, mask = XDR_ACE.unpack_from(data, offset)
+        offset += XDR_ACE.size
+        (length,) = XDR_UINT.unpack_from(data, offset)
+        offset += XDR_UINT.size
+        who = data[offset:offset + length].decode("utf-8")
+        # XDR opaque data is padded to a multiple of 4 bytes
+        offset += (length + 3) & ~3
+        aces.append((ace_type, flag, mask, who))
+    return aces
+
+
+def encode_acl(aces: list) -> bytes:
+    """
+    Encode an NFSv4 ACL in XDR
+    :param aces: the ACEs in order, as (type, flag, access mask, who)
+    :return: the raw attribute value
+    """
+    parts = [XDR_UINT.pack(len(aces))]
+    for ace_type, flag, mask, who in aces:
+        who = who.encode("utf-8")
+        parts.append(XDR_ACE.pack(ace_type, flag, mask))
+        parts.append(XDR_UINT.pack(len(who)))
+        parts.append(who.ljust((len(who) + 3) & ~3, b"\0"))
+    return b"".join(parts)
+
+
+def who_gid(who: str):
+    # Servers report principals as "name@domain" or as a bare numeric id
+    name = who.split("@", 1)[0]
+    if name.isdigit():
+        return int(name)
+    try:
+        return gid_of(name)
+    except KeyError:
+        return None
+
+
+def apply_changes(aces: list, grant: dict, revoke, flag=0) -> list:
+    """
+    Apply group ACE changes to an ACL
+    The ALLOW ACEs of revoked (or re-granted) groups are removed, granted groups get an ALLOW ACE in front of the ACL
+    DENY ACEs are left untouched, they were not set by CLEARS
+    :param aces: the ACEs of the ACL
+    :param grant: gid -> nfs4_setfacl permissions (e.g. "RX") of the groups to grant access to
+    :param revoke: gids of the groups to revoke access from
+    :param flag: extra flags of the granted ACEs (e.g. inheritance)
+    :return: the new ACEs
+    """
+    changed_gids = set(revoke) | set(grant)
+    kept = [ace for ace in aces
+            if not (ace[0] == ACE4_ACCESS_ALLOWED_ACE_TYPE and ace[1] & ACE4_IDENTIFIER_GROUP
+                    and ace[3] not in ("GROUP@", "OWNER@", "EVERYONE@") and who_gid(ace[3]) in changed_gids)]
+    granted = [(ACE4_ACCESS_ALLOWED_ACE_TYPE, ACE4_IDENTIFIER_GROUP | flag, parse_access_mask(permissions), str(gid))
+               for gid, permissions in grant.items()]
+    return granted + kept
+
+
+def update_acl_with_tools(path, grant: dict, revoke, flag=0):
+    # Fallback: one nfs4_getfacl and one nfs4_setfacl -s replacing the whole ACL
+    if isinstance(path, int):
+        # An open file descriptor, reached by the tools through procfs
+        path = f"/proc/{os.getpid()}/fd/{path}"
+    output = subprocess.run(["nfs4_getfacl", path], stdout=subprocess.PIPE, text=True, check=True).stdout
+    aces = [parse_ace(line.strip()) for line in output.splitlines() if line.strip() and not line.startswith("#")]
+    new_aces = apply_changes(aces, grant, revoke, flag)
+    if new_aces != aces:
+        subprocess.run(["nfs4_setfacl", "-s", ",".join(format_ace(ace) for ace in new_aces), path], check=True)
+
+
+def update_acl(path, grant=None, revoke=(), flag=0):
+    """
+    Apply several group ACE changes to the NFSv4 ACL of a file/directory with one read and one write
+    :param path: the file/directory, or an open file descriptor
+    :param grant: gid -> nfs4_setfacl permissions (e.g. "RX") of the groups to grant access to
+    :param revoke: gids of the groups to revoke access from
+    :param flag: extra flags of the granted ACEs, e.g. ACE4_FILE_INHERIT_ACE | ACE4_DIRECTORY_INHERIT_ACE
+    """
+    grant = grant or dict()
+    try:
+        aces = decode_acl(os.getxattr(path, NFS4_ACL))
+    except OSError as e:
+        if e.errno not in (errno.ENOTSUP, errno.ENODATA):
+            raise
+        update_acl_with_tools(path, grant, revoke, flag)
+        return
+
+    new_aces = apply_changes(aces, grant, revoke, flag)
+    if new_aces != aces:
+        os.setxattr(path, NFS4_ACL, encode_acl(new_aces))
@@ -0,0 +1,138 @@
+import errno
+import os
+import stat
+import struct
+
+# Layout of the system.posix_acl_access / system.posix_acl_default extended attributes (linux/posix_acl_xattr.h)
+ACL_ACCESS = "system.posix_acl_access"
+ACL_DEFAULT = "system.posix_acl_default"
+ACL_XATTR_VERSION = 2
+
+ACL_HEADER = struct.Struct("<I")
+ACL_ENTRY = struct.Struct("<HHI")
+
+ACL_USER_OBJ = 0x01
+ACL_USER = 0x02
+ACL_GROUP_OBJ = 0x04
+ACL_GROUP = 0x08
+ACL_MASK = 0x10
+ACL_OTHER = 0x20
+
+ACL_UNDEFINED_ID = 0xFFFFFFFF
+
+# The entries whose permissions are limited by the mask
+GROUP_CLASS_TAGS = (ACL_USER, ACL_GROUP_OBJ, ACL_GROUP)
+
+
+def parse_permissions(permissions: str, mode=0) -> int:
+    """
+    Convert symbolic permissions into the ACL permission bits
+    :param permissions: e.g. "rwx", "r-x" or "rwX" (X: execute only for directories and files executable by someone)
+    :param mode: the mode of the file, for X
+    :return: the permission bits (r=4, w=2, x=1)
+    """
+    executable = "x" in permissions or ("X" in permissions and (stat.S_ISDIR(mode) or mode & 0o111))
+    return (4 if "r" in permissions else 0) | (2 if "w" in permissions else 0) | (1 if executable else 0)
+
+
+def decode_acl(data: bytes) -> dict:
+    """
+    Decode an ACL extended attribute
+    :param data: the raw attribute value
+    :return: (tag, id) -> permission bits
+    """
+    (version,) = ACL_HEADER.unpack_from(data, 0)
+    if version != ACL_XATTR_VERSION:
+        raise ValueError(f"Unsupported POSIX ACL version {version}")
+    return {(tag, qualifier): permissions
+            for tag, permissions, qualifier in ACL_ENTRY.iter_unpack(data[ACL_HEADER.size:])}
+
+
+def encode_acl(entries: dict) -> bytes:
+    """
+    Encode an ACL extended attribute, entries ordered by tag then qualifier as the kernel requires
+    :param entries: (tag, id) -> permission bits
+    :return: the raw attribute value
+    """
+    return ACL_HEADER.pack(ACL_XATTR_VERSION) + b"".join(
+        ACL_ENTRY.pack(tag, entries[(tag, qualifier)], qualifier) for tag, qualifier in sorted(entries))
+
+
+def acl_from_mode(mode: int) -> dict:
+    # The minimal ACL equivalent to the permission bits of the mode
+    return {
+        (ACL_USER_OBJ, ACL_UNDEFINED_ID): (mode >> 6) & 7,
+        (ACL_GROUP_OBJ, ACL_UNDEFINED_ID): (mode >> 3) & 7,
+        (ACL_OTHER, ACL_UNDEFINED_ID): mode & 7,
+    }
+
+
+def read_acl(path, attribute=ACL_ACCESS) -> dict:
+    """
+    Read the ACL of a file/directory
+    :param path: the file/directory, or an open file descriptor
+    :param attribute: ACL_ACCESS or ACL_DEFAULT
+    :return: (tag, id) -> permission bits; the mode-equivalent ACL if the file has no access ACL,
+             an empty dict if the directory has no default ACL
+    """
+    try:
+        return decode_acl(os.getxattr(path, attribute))
+    except OSError as e:
+        if e.errno != errno.ENODATA:
+            raise
+    if attribute == ACL_DEFAULT:
+        return dict()
+    return acl_from_mode(os.stat(path).st_mode)
+
+
+def recompute_mask(entries: dict):
+    # The mask is the union of the group class permissions, and is only needed while named entries exist
+    entries.pop((ACL_MASK, ACL_UNDEFINED_ID), None)
+    if any(tag in (ACL_USER, ACL_GROUP) for tag, _ in entries):
+        mask = 0
+        for (tag, _), permissions in entries.items():
+            if tag in GROUP_CLASS_TAGS:
+                mask |= permissions
+        entries[(ACL_MASK, ACL_UNDEFINED_ID)] = mask
+
+
+def update_acl(path, grant=None, revoke=(), attribute=ACL_ACCESS):
+    """
+    Apply several group entry changes to the ACL of a file/directory in a single read-modify-write
+    Revocations are applied before grants, so a revoke-then-grant pair becomes one atomic ACL write
+    :param path: the file/directory, or an open file descriptor
+    :param grant: gid -> symbolic permissions (e.g. "rwx") of the group entries to add or replace
+    :param revoke: gids of the group entries to remove
+    :param attribute: ACL_ACCESS or ACL_DEFAULT (directories only)
+    """
+    grant = grant or dict()
+    entries = read_acl(path, attribute)
+    if not entries:
+        if not grant:
+            return
+        # A new default ACL starts from the owner, group and other permissions of the directory
+        entries = {key: permissions for key, permissions in read_acl(path, ACL_ACCESS).items()
+                   if key[0] in (ACL_USER_OBJ, ACL_GROUP_OBJ, ACL_OTHER)}
+
+    mode = os.stat(path).st_mode if any("X" in permissions for permissions in grant.values()) else 0
+
+    original = dict(entries)
+    for gid in revoke:
+        entries.pop((ACL_GROUP, gid), None)
+    for gid, permissions in grant.items():
+        entries[(ACL_GROUP, gid)] = parse_permissions(permissions, mode)
+    recompute_mask(entries)
+
+    if entries == original:
+        return
+
+    if attribute == ACL_DEFAULT and (ACL_MASK, ACL_UNDEFINED_ID) not in entries:
+        # No named entry is inherited anymore, drop the default ACL so that new files follow the umask again
+        try:
+            os.removexattr(path, ACL_DEFAULT)
+        except OSError as e:
+            if e.errno != errno.ENODATA:
+                raise
+        return
+
+    os.setxattr(path, attribute, encode_acl(entries))
@@ -0,0 +1,247 @@
+#!/usr/bin/python3
+
+import argparse
+import json
+import mmap
+import os
+import struct
+
+from utilities.identity import to_uid
+
+# Compact binary layout of a project (collaboration network) file, all integers little-endian:
+#   header      magic, format version, the size of every section below and the journal sequence number
+#   users       one int64 uid per user ordinal
+#   members     per collaborator (all_user_ids): uint32 index into the string table
+#   contexts    fixed-width records (member_start, member_count, resource_start, resource_count)
+#   memberships uint32 user ordinals, sliced by the context records
+#   resources   fixed-width records (resource_type, flags, path string index), sliced by the context records;
+#               flags bit 0 marks resources whose privileges are propagated recursively
+#   strings     (count + 1) uint32 offsets followed by the utf-8 blob; string 0 is the project id
+BINARY_MAGIC = b"CLRSNET\0"
+BINARY_VERSION = 2
+
+HEADER = struct.Struct("<8sIIIIIIIQ")
+# Version 1 files predate the journal sequence number
+HEADER_V1 = struct.Struct("<8sIIIIIII")
+CONTEXT_RECORD = struct.Struct("<IIII")
+RESOURCE_RECORD = struct.Struct("<III")
+RESOURCE_RECURSIVE = 0x1
+
+
+def encode_binary(data: dict) -> bytes:
+    """
+    Serialize a network dict (as produced by Network.to_dict) into the compact binary format
+    :param data: the network dict
+    :return: the encoded project file content
+    """
+    strings = []
+    string_ids = dict()
+
+    def intern(value: str) -> int:
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value.encode("utf-8"))
+        return string_ids[value]
+
+    intern(data["project_id"])
+    collaborators = [intern(username) for username in data["all_user_ids"]]
+
+    users = []
+    user_ordinals = dict()
+    context_records = []
+    memberships = []
+    resources = []
+    recursive_resources = set((resource_type, resource_path)
+                              for resource_type, resource_path in data.get("recursive_resources", []))
+
+    for context in data["contexts"].values():
+        member_start = len(memberships)
+        for uid in sorted(to_uid(user_id) for user_id in context["user_ids"]):
+            if uid not in user_ordinals:
+                user_ordinals[uid] = len(users)
+                users.append(uid)
+            memberships.append(user_ordinals[uid])
+
+        resource_start = len(resources)
+        for resource_type, resource_path in context["resource_ids"]:
+            flags = RESOURCE_RECURSIVE if (resource_type, resource_path) in recursive_resources else 0
+            resources.append((resource_type, flags, intern(resource_path)))
+
+        context_records.append((member_start, len(memberships) - member_start,
+                                resource_start, len(resources) - resource_start))
+
+    string_offsets = [0]
+    for value in strings:
+        string_offsets.append(string_offsets[-1] + len(value))
+
+    chunks = [
+        HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(strings), len(users), len(collaborators),
+                    len(context_records), len(memberships), len(resources), data.get("journal_seq", 0)),
+        struct.pack(f"<{len(users)}q", *users),
+        struct.pack(f"<{len(collaborators)}I", *collaborators),
+        b"".join(CONTEXT_RECORD.pack(*record) for record in context_records),
+        struct.pack(f"<{len(memberships)}I", *memberships),
+        b"".join(RESOURCE_RECORD.pack(*record) for record in resources),
+        struct.pack(f"<{len(string_offsets)}I", *string_offsets),
+        b"".join(strings),
+    ]
+    return b"".join(chunks)
+
+
+def decode_binary(buffer) -> dict:
+    """
+    Deserialize the compact binary format back into a network dict (as consumed by network_from_dict)
+    :param buffer: any buffer holding the file content (bytes, mmap)
+    :return: the network dict
+    """
+    magic, version = struct.unpack_from("<8sI", buffer, 0)
+
+    if magic != BINARY_MAGIC:
+        raise ValueError("Not a binary CLEARS project file")
+    if version == BINARY_VERSION:
+        (_, _, n_strings, n_users, n_collaborators,
+         n_contexts, n_memberships, n_resources, journal_seq) = HEADER.unpack_from(buffer, 0)
+        offset = HEADER.size
+    elif version == 1:
+        (_, _, n_strings, n_users, n_collaborators,
+         n_contexts, n_memberships, n_resources) = HEADER_V1.unpack_from(buffer, 0)
+        journal_seq = 0
+        offset = HEADER_V1.size
+    else:
+        raise ValueError(f"Unsupported binary project file version {version}")
+
+    users = struct.unpack_from(f"<{n_users}q", buffer, offset)
+    offset += 8 * n_users
+    collaborators = struct.unpack_from(f"<{n_collaborators}I", buffer, offset)
+    offset += 4 * n_collaborators
+    context_records = list(CONTEXT_RECORD.iter_unpack(buffer[offset:offset + CONTEXT_RECORD.size * n_contexts]))
+    offset += CONTEXT_RECORD.size * n_contexts
+    memberships = struct.unpack_from(f"<{n_memberships}I", buffer, offset)
+    offset += 4 * n_memberships
+    resources = list(RESOURCE_RECORD.iter_unpack(buffer[offset:offset + RESOURCE_RECORD.size * n_resources]))
+    offset += RESOURCE_RECORD.size * n_resources
+    string_offsets = struct.unpack_from(f"<{n_strings + 1}I", buffer, offset)
+    offset += 4 * (n_strings + 1)
+
+    blob = buffer[offset:offset + string_offsets[-1]]
+    strings = [blob[string_offsets[i]:string_offsets[i + 1]].decode("utf-8") for i in range(n_strings)]
+
+    contexts = dict()
+    resource_index = []
+    recursive_resources = []
+    for member_start, member_count, resource_start, resource_count in context_records:
+        user_ids = [users[ordinal] for ordinal in memberships[member_start:member_start + member_count]]
+        context_id = ''.join(sorted(str(uid) for uid in user_ids))
+        resource_ids = []
+        for resource_type, flags, path_index in resources[resource_start:resource_start + resource_count]:
+            resource_ids.append([resource_type, strings[path_index]])
+            resource_index.append([resource_type, strings[path_index], context_id])
+            if flags & RESOURCE_RECURSIVE:
+                recursive_resources.append([resource_type, strings[path_index]])
+        contexts[context_id] = {"id": context_id, "user_ids": user_ids, "resource_ids": resource_ids}
+
+    return {
+        "project_id": strings[0],
+        "all_user_ids": [strings[index] for index in collaborators],
+        "contexts": contexts,
+        "resource_index": resource_index,
+        "recursive_resources": recursive_resources,
+        "journal_seq": journal_seq,
+    }
+
+
+def is_binary_project_file(project_file: str) -> bool:
+    """
+    Auto-detect the on-disk format of a project file
+    :param project_file: path of the project file
+    :return: True for the compact binary format, False for JSON (or a missing file)
+    """
+    try:
+        with open(project_file, "rb") as file:
+            return file.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    except FileNotFoundError:
+        return False
+
+
+def load_project_data(project_file: str) -> dict:
+    """
+    Read a project file in either format
+    :param project_file: path of the project file
+    :return: the network dict
+    """
+    with open(project_file, "rb") as file:
+        if file.read(len(BINARY_MAGIC)) == BINARY_MAGIC:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                return decode_binary(buffer)
+        file.seek(0)
+        return json.load(file)
+
+
+def serialize_project_data(data: dict, binary: bool) -> bytes:
+    """
+    Serialize a network dict in the requested format
+    :param data: the network dict
+    :param binary: True for the compact binary format, False for JSON
+    :return: the file content
+    """
+    if binary:
+        return encode_binary(data)
+    return json.dumps(data, indent=4).encode("utf-8")
+
+
+def convert_project_file(project_file: str, binary: bool, output_file=None):
+    """
+    Convert a project file between the JSON and the compact binary format
+    Later writes keep whichever format the project file is in
+    The project is locked and read (snapshot and journal) like any operation does, so that no concurrent write is
+    lost, and converted in place through the project store
+    :param project_file: path of the project file to convert
+    :param binary: True to convert to the binary format, False to convert to JSON
+    :param output_file: where to write the result, defaults to converting in place
+    """
+    # Imported here: the conversion is an administrative tool, the project readers do not need the operations
+    from utilities.collab import project_locks, project_store
+
+    with project_locks.holding([project_file]):
+        network = project_store.load(project_file)
+        data = network.to_dict()
+
+        # The binary format marks recursive sharing on the placed resources only
+        if binary:
+            unplaced = set((resource_type, resource_path)
+                           for resource_type, resource_path in data.get("recursive_resources", [])) \
+                       - network.get_placements().keys()
+            if unplaced:
+                raise ValueError(f"{len(unplaced)} recursive markers are on resources that are not shared "
+                                 f"(e.g. {sorted(unplaced)[0][1]}), they cannot be stored in the binary format")
+
+        if output_file is None or os.path.abspath(output_file) == os.path.abspath(project_file):
+            # A fresh snapshot in the new format, the journal is folded into it
+            if not project_store.save(project_file, network, [], snapshot=True, binary=binary):
+                raise RuntimeError(f"Failed to write '{project_file}'")
+            return
+
+        # Write next to the destination and rename, so readers never see a half-written file
+        temp_file = output_file + ".tmp"
+        with open(temp_file, "wb") as file:
+            file.write(serialize_project_data(data, binary))
+        os.replace(temp_file, output_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert CLEARS project files between JSON and binary formats')
+    parser.add_argument('format', choices=['binary', 'json'], help='Target format')
+    parser.add_argument('project_file', help='Project file to convert, e.g. /etc/project/Project1.json')
+    parser.add_argument('-o', '--output', help='Output file (defaults to converting in place)')
+
+    args = parser.parse_args()
+    try:
+        convert_project_file(args.project_file, binary=args.format == 'binary', output_file=args.output)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"Error: {e}")
+        exit(1)
+    print(f"Project file '{args.output or args.project_file}' converted to {args.format}.")
+
+
+if __name__ == "__main__":
+    main()
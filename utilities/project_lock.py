@@ -0,0 +1,122 @@
+import fcntl
+import os
+import threading
+from contextlib import contextmanager
+
+
+def get_lock_path(project_file: str) -> str:
+    """
+    The lock file kept next to a project file
+    :param project_file: path of the project file (the snapshot)
+    :return: path of the lock file, e.g. /etc/project/Project1.lock
+    """
+    return os.path.splitext(project_file)[0] + ".lock"
+
+
+class ProjectLocks:
+    """
+    Per-project advisory locks (flock on /etc/project/<project>.lock) held across the read-modify-write of a project
+    Operations on different projects run concurrently, operations on the same project queue on its lock
+    Locks are re-entrant within a thread, so an operation running inside a batch that already holds its project
+    does not deadlock; each thread takes its own flock (on its own descriptor), so the threads of the daemon queue on
+    a project just like processes do
+    Lock files are only created for projects that exist or are being created, and may be archived with their project:
+    a lock taken on a lock file that was replaced meanwhile is taken again on the current one
+    """
+
+    def __init__(self, writer):
+        """
+        :param writer: callable (path, content: bytes, append) writing a file within /etc/project (the privileged
+                       wrapper)
+        """
+        self.__writer = writer
+        self.__local = threading.local()
+
+    def __get_held(self) -> dict:
+        # project file -> [lock file descriptor, hold count], of the current thread
+        held = getattr(self.__local, "held", None)
+        if held is None:
+            held = self.__local.held = dict()
+        return held
+
+    def is_held(self, project_file: str) -> bool:
+        return project_file in self.__get_held()
+
+    def acquire(self, project_file: str, create=False):
+        """
+        Lock a project, waiting for the processes holding it
+        :param project_file: path of the project file
+        :param create: the project is being created, its lock file may not exist yet
+        """
+        held = self.__get_held().get(project_file)
+        if held is not None:
+            held[1] += 1
+            return
+
+        lock_file = get_lock_path(project_file)
+        while True:
+            if not os.path.exists(lock_file):
+                # No lock file is left behind for a project that does not exist (e.g. a mistyped id)
+                if not create and not os.path.exists(project_file):
+                    raise FileNotFoundError(f"Project file '{project_file}' not found")
+                # The lock file is created once by the privileged writer (appending, so a lock file created meanwhile
+                # by another process is kept), everybody may lock it read-only
+                self.__writer(lock_file, b"", append=True)
+            try:
+                lock_fd = os.open(lock_file, os.O_RDONLY)
+            except FileNotFoundError:
+                # Archived with its project in between
+                continue
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+                # The project may have been ended (its lock file archived) while waiting, the lock must be the current
+                # lock file's
+                metadata = os.fstat(lock_fd)
+                try:
+                    current = os.stat(lock_file)
+                    stale = (current.st_dev, current.st_ino) != (metadata.st_dev, metadata.st_ino)
+                except FileNotFoundError:
+                    stale = True
+            except BaseException:
+                os.close(lock_fd)
+                raise
+            if not stale:
+                break
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
+        self.__get_held()[project_file] = [lock_fd, 1]
+
+    def release(self, project_file: str):
+        """
+        Release a project locked with acquire(), the lock is dropped when the outermost hold ends
+        :param project_file: path of the project file
+        """
+        held = self.__get_held().get(project_file)
+        if held is None:
+            return
+        held[1] -= 1
+        if held[1] == 0:
+            del self.__get_held()[project_file]
+            fcntl.flock(held[0], fcntl.LOCK_UN)
+            os.close(held[0])
+
+    @contextmanager
+    def holding(self, project_files, created_files=()):
+        """
+        Hold several projects at once, locked in sorted order so that two holders never wait on each other
+        Projects that do not exist are not locked, their operations fail on their own
+        :param project_files: paths of the project files
+        :param created_files: paths of the project files of projects being created, locked even if they do not exist
+        """
+        locked = []
+        try:
+            for project_file in sorted(set(project_files) | set(created_files)):
+                try:
+                    self.acquire(project_file, create=project_file in created_files)
+                except FileNotFoundError:
+                    continue
+                locked.append(project_file)
+            yield self
+        finally:
+            for project_file in reversed(locked):
+                self.release(project_file)
@@ -0,0 +1,138 @@
+import os
+import threading
+from collections import OrderedDict
+
+from classes.collab import Network, network_from_dict
+from utilities.journal import encode_mutations, get_journal_path, needs_compaction, read_journal, replay_journal
+from utilities.project_file import is_binary_project_file, load_project_data, serialize_project_data
+
+# Parsed projects kept in memory, the least recently used ones are evicted past this many
+PROJECT_CACHE_SIZE = 64
+
+
+def get_file_signature(path: str):
+    """
+    :param path: a file
+    :return: (inode, mtime, size) of the file, which change whenever it is written, or None if it does not exist
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class ProjectStore:
+    """
+    Owns the loading and saving of projects
+    The parsed snapshot and journal of each project are cached and revalidated against the inode, mtime and size of
+    the files on every load, so a project is parsed again only after it was written; the least recently used
+    projects are evicted past a bound
+    Every load builds a new Network from the cached data, callers never share mutable state through the cache
+    The cache may be used by several threads (the daemon), the cached data itself is never modified
+    """
+
+    def __init__(self, writer, capacity=PROJECT_CACHE_SIZE):
+        """
+        :param writer: callable (path, content: bytes, append) writing a file within /etc/project (the privileged
+                       wrapper)
+        :param capacity: number of projects kept in memory
+        """
+        self.__writer = writer
+        self.__capacity = capacity
+        # project file -> (snapshot signature, snapshot data, journal signature, journal mutations)
+        self.__entries: OrderedDict[str, tuple] = OrderedDict()
+        self.__entries_lock = threading.Lock()
+
+    def __read(self, project_file: str) -> tuple:
+        # The files are stat'ed before they are read: a write in between leaves a stale signature, which only
+        # causes one more read later
+        snapshot_signature = get_file_signature(project_file)
+        if snapshot_signature is None:
+            self.forget(project_file)
+            raise FileNotFoundError(f"Project file '{project_file}' not found")
+        journal_signature = get_file_signature(get_journal_path(project_file))
+
+        with self.__entries_lock:
+            entry = self.__entries.get(project_file)
+        if entry is not None and entry[0] == snapshot_signature:
+            data = entry[1]
+            mutations = entry[3] if entry[2] == journal_signature else read_journal(project_file)
+        else:
+            data = load_project_data(project_file)
+            mutations = read_journal(project_file)
+
+        with self.__entries_lock:
+            self.__entries[project_file] = (snapshot_signature, data, journal_signature, mutations)
+            self.__entries.move_to_end(project_file)
+            while len(self.__entries) > self.__capacity:
+                self.__entries.popitem(last=False)
+        return data, mutations
+
+    def load(self, project_file: str) -> Network:
+        """
+        Load a project: the last snapshot with the journal replayed on top of it
+        :param project_file: path of the project file
+        :return: the up-to-date network
+        """
+        data, mutations = self.__read(project_file)
+        network = network_from_dict(data)
+        replay_journal(network, mutations)
+        return network
+
+    @staticmethod
+    def get_signature(project_file: str) -> tuple:
+        """
+        :param project_file: path of the project file
+        :return: the signatures of the project file and its journal, which change with every write of the project
+        """
+        return get_file_signature(project_file), get_file_signature(get_journal_path(project_file))
+
+    def get_version(self, project_file: str) -> int:
+        """
+        The version of a project as stored: the sequence number of its last committed mutation
+        It grows with every write, so it only matches the version a network was loaded at if nothing was written since
+        :param project_file: path of the project file
+        :return: the version
+        """
+        data, mutations = self.__read(project_file)
+        version = data.get("journal_seq", 0)
+        # Records already folded into the snapshot may linger in the journal, they carry lower sequence numbers
+        for mutation in mutations:
+            version = max(version, mutation["seq"])
+        return version
+
+    def save(self, project_file: str, network: Network, mutations: list, snapshot=False, binary=None) -> bool:
+        """
+        Write drained mutations to the project journal, or a full snapshot of the network when one is due
+        :param project_file: path of the project file
+        :param network: the network the mutations were drained from
+        :param mutations: the drained mutation records
+        :param snapshot: force a full snapshot (e.g. when (re)creating a project)
+        :param binary: format of the snapshot, None to keep the format the project file is already stored in
+        :return: True on success
+        """
+        journal = encode_mutations(mutations)
+
+        if snapshot or needs_compaction(project_file, len(journal)):
+            # Fold everything into a fresh snapshot
+            if binary is None:
+                binary = is_binary_project_file(project_file)
+            network_data = serialize_project_data(network.to_dict(), binary=binary)
+            journal_path = get_journal_path(project_file)
+            if not self.__writer(project_file, network_data):
+                return False
+            if os.path.exists(journal_path):
+                # Records already folded into the snapshot are skipped on replay, so truncating last is crash-safe
+                self.__writer(journal_path, b"")
+            return True
+
+        elif mutations:
+            return self.__writer(get_journal_path(project_file), journal, append=True)
+
+        return True
+
+    def forget(self, project_file: str):
+        # Drop a project from memory (e.g. once it is archived)
+        with self.__entries_lock:
+            self.__entries.pop(project_file, None)
@@ -0,0 +1,175 @@
+import os
+import queue
+import stat
+import threading
+import time
+
+# Enough concurrent ACL writes to hide NFS round-trip latency
+PROPAGATION_WORKERS = 16
+
+# Seconds between progress reports
+PROGRESS_INTERVAL = 5.0
+
+# Errors reported individually, the others are only counted
+REPORTED_ERRORS = 10
+
+# Only regular files and directories carry collaboration ACLs; devices, FIFOs and sockets are never opened
+OPEN_FLAGS = os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK
+
+
+class TreePropagation:
+    """
+    Applies a privilege update to every file and directory below a directory, in parallel
+    Directories are walked with os.scandir by a pool of threads sharing a depth-first stack, so memory holds the
+    pending directories only, never a listing of the tree
+    Entries are opened relative to their parent directory without following symlinks, and only entries owned by
+    the owner of the tree are updated and descended into, unless an update for the other entries is given (e.g. a
+    revocation, which must also reach what collaborators created with the inherited ACL); the walk does not cross
+    mount points
+    """
+
+    def __init__(self, apply, owner_uid: int, workers=PROPAGATION_WORKERS, progress_interval=PROGRESS_INTERVAL,
+                 apply_foreign=None):
+        """
+        :param apply: callable (fd, is_directory) updating the privileges of an open file/directory
+        :param owner_uid: only entries owned by this uid are updated with apply
+        :param workers: number of threads
+        :param progress_interval: seconds between progress reports
+        :param apply_foreign: callable (fd, is_directory) updating the entries owned by other users, None to skip them
+        """
+        self.__apply = apply
+        self.__apply_foreign = apply_foreign
+        self.__owner_uid = owner_uid
+        self.__workers = workers
+        self.__progress_interval = progress_interval
+
+        self.__pending = queue.LifoQueue()
+        self.__lock = threading.Lock()
+        self.__updated = 0
+        self.__skipped = 0
+        self.__error_count = 0
+        self.__errors = []
+
+    def __count(self, updated=0, skipped=0, error=None):
+        with self.__lock:
+            self.__updated += updated
+            self.__skipped += skipped
+            if error is not None:
+                self.__error_count += 1
+                if len(self.__errors) < REPORTED_ERRORS:
+                    self.__errors.append(error)
+
+    def __update_entry(self, directory_fd: int, path: str, name: str, device: int):
+        # Apply the update to one entry, returns its (device, inode) if it is a directory to descend into
+        try:
+            fd = os.open(name, OPEN_FLAGS, dir_fd=directory_fd)
+        except OSError as e:
+            self.__count(error=f"{path}: {e}")
+            return None
+        try:
+            metadata = os.fstat(fd)
+            is_directory = stat.S_ISDIR(metadata.st_mode)
+            apply = self.__apply if metadata.st_uid == self.__owner_uid else self.__apply_foreign
+            if apply is None or metadata.st_dev != device:
+                self.__count(skipped=1)
+                return None
+            apply(fd, is_directory)
+            self.__count(updated=1)
+            return (metadata.st_dev, metadata.st_ino) if is_directory else None
+        except Exception as e:
+            # Whatever the update raised (OSError, a malformed ACL, a failed nfs4_setfacl), the walk goes on
+            self.__count(error=f"{path}: {e}")
+            return None
+        finally:
+            os.close(fd)
+
+    def __walk_directory(self, path: str, identity: tuple):
+        try:
+            directory_fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW)
+        except OSError as e:
+            self.__count(error=f"{path}: {e}")
+            return
+        try:
+            # The directory must still be the one seen by its parent (it was not swapped for another one)
+            metadata = os.fstat(directory_fd)
+            if (metadata.st_dev, metadata.st_ino) != identity:
+                self.__count(error=f"{path}: changed during the walk")
+                return
+
+            with os.scandir(directory_fd) as entries:
+                for entry in entries:
+                    if entry.is_symlink() or not (entry.is_file(follow_symlinks=False)
+                                                  or entry.is_dir(follow_symlinks=False)):
+                        self.__count(skipped=1)
+                        continue
+                    child_path = os.path.join(path, entry.name)
+                    child_identity = self.__update_entry(directory_fd, child_path, entry.name, identity[0])
+                    if child_identity is not None:
+                        self.__pending.put((child_path, child_identity))
+        except Exception as e:
+            self.__count(error=f"{path}: {e}")
+        finally:
+            os.close(directory_fd)
+
+    def __worker(self):
+        while True:
+            item = self.__pending.get()
+            try:
+                if item is None:
+                    return
+                self.__walk_directory(*item)
+            except Exception as e:
+                # A worker never dies with directories still queued, the walk would never complete
+                self.__count(error=f"{item[0]}: {e}")
+            finally:
+                self.__pending.task_done()
+
+    def run(self, root: str, identity=None) -> int:
+        """
+        Update everything below a directory (the directory itself is left to the caller)
+        :param root: absolute path of the directory
+        :param identity: (device, inode) the directory must have, e.g. from the descriptor the caller updated it
+                         through; the walk stops if the path now leads elsewhere
+        :return: the number of entries updated
+        """
+        if identity is None:
+            metadata = os.lstat(root)
+            identity = (metadata.st_dev, metadata.st_ino)
+        self.__pending.put((root, identity))
+
+        threads = [threading.Thread(target=self.__worker, daemon=True) for _ in range(self.__workers)]
+        for thread in threads:
+            thread.start()
+
+        done = threading.Event()
+        threading.Thread(target=lambda: (self.__pending.join(), done.set()), daemon=True).start()
+
+        started = time.monotonic()
+        while not done.wait(self.__progress_interval):
+            print(f"{root}: {self.__updated} entries updated ({time.monotonic() - started:.0f}s)", flush=True)
+
+        for _ in threads:
+            self.__pending.put(None)
+        for thread in threads:
+            thread.join()
+
+        print(f"{root}: {self.__updated} entries updated, {self.__skipped} skipped, {self.__error_count} errors")
+        for error in self.__errors:
+            print(f"Warning: {error}")
+        return self.__updated
+
+
+def propagate_tree(root: str, apply, owner_uid: int, workers=PROPAGATION_WORKERS, identity=None,
+                   apply_foreign=None) -> int:
+    """
+    Apply a privilege update to every file and directory below a directory
+    :param root: absolute path of the directory
+    :param apply: callable (fd, is_directory) updating the privileges of an open file/directory
+    :param owner_uid: only entries owned by this uid are updated with apply
+    :param workers: number of threads
+    :param identity: (device, inode) the directory must have
+    :param apply_foreign: callable (fd, is_directory) updating the entries owned by other users, None to skip them
+    :return: the number of entries updated
+    """
+    return TreePropagation(apply, owner_uid=owner_uid, workers=workers,
+                           apply_foreign=apply_foreign).run(root, identity=identity)
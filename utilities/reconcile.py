@@ -0,0 +1,117 @@
+from typing import Tuple
+
+
+class NetworkState:
+    """
+    The privileges implied by a collaboration network at one point in time: the context holding each resource (its
+    LDAP group is in the resource's ACL or AllowGroups) and the existing contexts (their LDAP groups exist)
+    """
+
+    def __init__(self, network):
+        """
+        :param network: the Network to take the state of
+        """
+        self.__placements: dict[Tuple[int, str], str] = network.get_placements()
+        self.__context_masks: dict[str, int] = network.get_context_masks()
+        # User ordinals are never reassigned, so the masks of contexts deleted later can still be decoded
+        self.__mask_to_users = network.mask_to_users
+
+    def get_placements(self) -> dict[Tuple[int, str], str]:
+        return self.__placements
+
+    def get_context_ids(self) -> set[str]:
+        return set(self.__context_masks.keys())
+
+    def get_context_users(self, context_id: str) -> set[str]:
+        return self.__mask_to_users(self.__context_masks[context_id])
+
+
+class PrivilegeChanges:
+    """
+    The net changes between two states of a network, grouped per backend
+    A resource moved several times (or moved back) in between costs one change (or none), and a context created and
+    deleted in between never reaches LDAP
+    """
+
+    def __init__(self, before: NetworkState, after: NetworkState, project_id: str):
+        """
+        :param before: the state before the operation
+        :param after: the state after the operation
+        :param project_id: the project, prefix of the LDAP group names
+        """
+        self.__before = before
+        self.__after = after
+        self.__project_id = project_id
+
+        # Step 1: the resources whose holding context changed, (resource_type, resource) -> (old, new) context ids
+        before_placements = before.get_placements()
+        after_placements = after.get_placements()
+        self.__moves: dict[Tuple[int, str], Tuple[str | None, str | None]] = dict()
+        for resource in before_placements.keys() | after_placements.keys():
+            old_context_id = before_placements.get(resource)
+            new_context_id = after_placements.get(resource)
+            if old_context_id != new_context_id:
+                self.__moves[resource] = (old_context_id, new_context_id)
+
+        # Step 2: the groups to create (new contexts granted a resource) and to delete (contexts that are gone)
+        before_context_ids = before.get_context_ids()
+        after_context_ids = after.get_context_ids()
+        self.__contexts_to_create = set(new_context_id for _, new_context_id in self.__moves.values()
+                                        if new_context_id is not None and new_context_id not in before_context_ids)
+        self.__contexts_to_delete = before_context_ids - after_context_ids
+
+    def get_group(self, context_id: str) -> str:
+        # The LDAP group of a context: the project id followed by the sorted uids, i.e. the context id
+        return self.__project_id + context_id
+
+    def get_moves(self) -> dict[Tuple[int, str], Tuple[str | None, str | None]]:
+        """
+        :return: (resource_type, resource) -> (id of the context holding it before or None, after or None)
+        """
+        return self.__moves
+
+    def get_groups_to_create(self) -> dict[str, set[str]]:
+        """
+        :return: group name -> uids of the members, for the contexts that did not exist before
+        """
+        return {self.get_group(context_id): self.__after.get_context_users(context_id)
+                for context_id in sorted(self.__contexts_to_create)}
+
+    def get_groups_to_delete(self) -> list[str]:
+        """
+        :return: names of the groups of the contexts that no longer exist
+        """
+        return [self.get_group(context_id) for context_id in sorted(self.__contexts_to_delete)]
+
+    def get_file_changes(self) -> dict[str, Tuple[list[str], list[str]]]:
+        """
+        :return: file/directory -> (groups to grant, groups to revoke), one ACL update each
+        """
+        return {resource: ([self.get_group(new)] if new is not None else [],
+                           [self.get_group(old)] if old is not None else [])
+                for (resource_type, resource), (old, new) in self.__moves.items() if resource_type == 1}
+
+    def get_partition_changes(self) -> dict[str, Tuple[set[str], set[str]]]:
+        """
+        :return: partition -> (groups to allow, groups to disallow), one AllowGroups update each
+        """
+        return {resource: ({self.get_group(new)} if new is not None else set(),
+                           {self.get_group(old)} if old is not None else set())
+                for (resource_type, resource), (old, new) in self.__moves.items() if resource_type == 2}
+
+    def get_users_before(self, context_id: str) -> set[str]:
+        return self.__before.get_context_users(context_id)
+
+    def get_users_after(self, context_id: str) -> set[str]:
+        return self.__after.get_context_users(context_id)
+
+
+def reconcile(before: NetworkState, network, project_id: str) -> PrivilegeChanges:
+    """
+    Compute the net privilege changes an operation made to a network
+    :param before: the state taken before the operation
+    :param network: the Network after the operation
+    :param project_id: the project
+    :return: the changes to apply
+    """
+    return PrivilegeChanges(before, NetworkState(network), project_id)
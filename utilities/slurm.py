@@ -0,0 +1,150 @@
+import subprocess
+import threading
+from contextlib import contextmanager
+
+
+def parse_partitions(output: str) -> dict:
+    """
+    Parse the one-record-per-line output of `scontrol show partition -o`
+    :param output: the command output
+    :return: partition name -> {"AllowGroups": set of groups, "owner": owner username}
+    """
+    partitions = dict()
+    for line in output.splitlines():
+        fields = dict(field.split("=", 1) for field in line.split() if "=" in field)
+        name = fields.get("PartitionName")
+        if name is None:
+            continue
+        partitions[name] = {
+            "AllowGroups": set(fields.get("AllowGroups", "").split(",")),
+            # CLEARS partitions are named after their owner, e.g. alice_gpu
+            "owner": name.split("_")[0],
+        }
+    return partitions
+
+
+class SlurmPartitions:
+    """
+    The partitions known to slurmctld, fetched with a single scontrol call and answered from memory afterwards
+    AllowGroups changes made through CLEARS are recorded so the cache stays current within a command
+    The cache is per thread, so each command served by the daemon sees its own changes only
+    """
+
+    def __init__(self):
+        self.__local = threading.local()
+
+    def __load(self) -> dict:
+        partitions = getattr(self.__local, "partitions", None)
+        if partitions is None:
+            result = subprocess.run(['scontrol', 'show', 'partition', '-o'], stdout=subprocess.PIPE, text=True)
+            partitions = self.__local.partitions = parse_partitions(result.stdout)
+        return partitions
+
+    def invalidate(self):
+        # Forget the partitions, the next lookup fetches them again (e.g. at the start of each daemon request)
+        self.__local.partitions = None
+
+    def exists(self, partition: str) -> bool:
+        return partition in self.__load()
+
+    def is_owner(self, partition: str, username: str) -> bool:
+        """
+        Check whether a user owns a partition
+        :param partition: name of the partition
+        :param username: the user
+        :return: True if the partition exists and is named after the user
+        """
+        return partition in self.__load() and partition.startswith(username)
+
+    def get_owner(self, partition: str):
+        """
+        :param partition: name of the partition
+        :return: username of the owner of the partition, or None if the partition does not exist
+        """
+        partition_info = self.__load().get(partition)
+        return partition_info["owner"] if partition_info is not None else None
+
+    def get_allow_groups(self, partition: str) -> set:
+        """
+        :param partition: name of the partition
+        :return: a copy of the AllowGroups of the partition
+        """
+        return set(self.__load()[partition]["AllowGroups"])
+
+    def record_allow_groups(self, partition: str, groups: set):
+        """
+        Record the AllowGroups a partition was just updated to
+        :param partition: name of the partition
+        :param groups: the new AllowGroups
+        """
+        partition_info = self.__load().get(partition)
+        if partition_info is not None:
+            partition_info["AllowGroups"] = set(groups)
+
+
+class _DeferralState(threading.local):
+
+    def __init__(self):
+        # partition -> the AllowGroups it is to be updated to
+        self.pending: dict[str, set] = dict()
+        self.depth = 0
+
+
+class SlurmUpdateBatch:
+    """
+    Accumulates AllowGroups changes and applies only the final AllowGroups of each partition, all partitions in a
+    single invocation of the privileged updater
+    The partition cache is updated immediately, so later reads within the command see the pending changes
+    Deferrals are per thread, a thread only applies the changes it made
+    """
+
+    def __init__(self, partitions: SlurmPartitions, updater):
+        """
+        :param partitions: the partition cache
+        :param updater: callable (content: bytes) applying "<partition> <group,...>" lines (the privileged wrapper)
+        """
+        self.__partitions = partitions
+        self.__updater = updater
+        self.__local = _DeferralState()
+
+    def set_allow_groups(self, partition: str, groups: set):
+        """
+        Set the AllowGroups of a partition, applied when the outermost deferral ends (immediately outside of one)
+        :param partition: name of the partition
+        :param groups: the new AllowGroups
+        """
+        self.__local.pending[partition] = set(groups)
+        self.__partitions.record_allow_groups(partition, groups)
+        if self.__local.depth == 0:
+            self.flush()
+
+    def flush(self):
+        # Apply the pending AllowGroups of every partition at once
+        pending = self.__local.pending
+        if not pending:
+            return
+        content = "".join(f"{partition} {','.join(sorted(groups))}\n" for partition, groups in pending.items())
+        pending.clear()
+        self.__updater(content.encode("utf-8"))
+
+    @contextmanager
+    def deferred(self):
+        """
+        Defer the AllowGroups updates of a whole command to a single flush when the outermost deferral ends
+        Deferrals nest, and may also decorate a function (@batch.deferred())
+        """
+        self.__local.depth += 1
+        try:
+            yield self
+        finally:
+            self.__local.depth -= 1
+            if self.__local.depth == 0:
+                self.flush()
+
+
+# The process-wide partition cache
+_partitions = SlurmPartitions()
+
+
+def get_slurm_partitions() -> SlurmPartitions:
+    return _partitions
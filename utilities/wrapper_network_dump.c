@@ -3,41 +3,151 @@
 #include <string.h>
 #include <errno.h>
 #include <unistd.h>
+#include <fcntl.h>
+#include <libgen.h>
+#include <sys/stat.h>
 
 #define BUFFER_SIZE 4096
 
+// Copy stdin to an open file and flush it to disk
+static int copy_input(FILE *file, const char *project_file) {
+    char buffer[BUFFER_SIZE];
+    size_t bytes_read;
+
+    while ((bytes_read = fread(buffer, 1, sizeof(buffer), stdin)) > 0) {
+        if (fwrite(buffer, 1, bytes_read, file) != bytes_read) {
+            fprintf(stderr, "Failed to write to project '%s': %s\n", project_file, strerror(errno));
+            return 1;
+        }
+    }
+    if (ferror(stdin) || fflush(file) != 0 || fsync(fileno(file)) != 0) {
+        fprintf(stderr, "Failed to write to project '%s': %s\n", project_file, strerror(errno));
+        return 1;
+    }
+    return 0;
+}
+
+// Replace a file (project snapshot) atomically: readers see either the old or the new content, never a torn one
+// The new content is written to a temporary file in the same directory, flushed, then renamed over the file
+static int replace_file(const char *project_file) {
+    size_t length = strlen(project_file);
+    char *temporary_file = malloc(length + sizeof(".XXXXXX"));
+    if (temporary_file == NULL) {
+        perror("malloc");
+        return 1;
+    }
+    memcpy(temporary_file, project_file, length);
+    memcpy(temporary_file + length, ".XXXXXX", sizeof(".XXXXXX"));
+
+    int fd = mkstemp(temporary_file);
+    if (fd < 0) {
+        fprintf(stderr, "Failed to create project '%s': %s\n", project_file, strerror(errno));
+        free(temporary_file);
+        return 1;
+    }
+
+    // Keep the permissions of the file being replaced, or those fopen would have given a new one
+    struct stat metadata;
+    mode_t mode = 0644;
+    if (stat(project_file, &metadata) == 0) {
+        mode = metadata.st_mode & 07777;
+    }
+
+    FILE *file = fdopen(fd, "w");
+    if (file == NULL || fchmod(fd, mode) != 0 || copy_input(file, project_file) != 0) {
+        if (file == NULL) {
+            fprintf(stderr, "Failed to create project '%s': %s\n", project_file, strerror(errno));
+            close(fd);
+        } else {
+            fclose(file);
+        }
+        unlink(temporary_file);
+        free(temporary_file);
+        return 1;
+    }
+
+    if (fclose(file) != 0 || rename(temporary_file, project_file) != 0) {
+        fprintf(stderr, "Failed to update project '%s': %s\n", project_file, strerror(errno));
+        unlink(temporary_file);
+        free(temporary_file);
+        return 1;
+    }
+    free(temporary_file);
+
+    // The rename itself is durable once the directory is flushed
+    char *project_file_copy = strdup(project_file);
+    if (project_file_copy != NULL) {
+        int directory_fd = open(dirname(project_file_copy), O_RDONLY | O_DIRECTORY);
+        if (directory_fd >= 0) {
+            fsync(directory_fd);
+            close(directory_fd);
+        }
+        free(project_file_copy);
+    }
+    return 0;
+}
+
+// Move a file (an ended project's snapshot or journal) to its archive, creating the archive directory if needed
+static int archive_file(const char *source, const char *destination) {
+    char *destination_copy = strdup(destination);
+    if (destination_copy == NULL) {
+        perror("strdup");
+        return 1;
+    }
+    const char *archive_dir = dirname(destination_copy);
+    if (mkdir(archive_dir, 0700) != 0 && errno != EEXIST) {
+        fprintf(stderr, "Failed to create '%s': %s\n", archive_dir, strerror(errno));
+        free(destination_copy);
+        return 1;
+    }
+    free(destination_copy);
+
+    if (rename(source, destination) != 0) {
+        fprintf(stderr, "Failed to archive '%s': %s\n", source, strerror(errno));
+        return 1;
+    }
+    printf("Project file '%s' archived to '%s'.\n", source, destination);
+    return 0;
+}
+
 // Updated main
+// With -a the input is appended to the file (project journal) instead of atomically replacing it (project snapshot)
+// With -m the file is moved to the given archive path instead
 int main(int argc, char *argv[]) {
-    if (argc != 2) {
-        fprintf(stderr, "Usage: %s project_file\n", argv[0]);
+    int append = (argc == 3 && strcmp(argv[1], "-a") == 0);
+    int archive = (argc == 4 && strcmp(argv[1], "-m") == 0);
+
+    if (argc != 2 && !append && !archive) {
+        fprintf(stderr, "Usage: %s [-a] project_file | -m project_file archive_file\n", argv[0]);
         return 1;
     }
 
-    const char *project_file = argv[1];
+    const char *project_file = archive ? argv[2] : argv[argc - 1];
 
     if (setuid(0) != 0) {
         perror("setuid");
         return 1;
     }
 
-    FILE *file = fopen(project_file, "w");
-    if (file == NULL) {
-        fprintf(stderr, "Failed to create project '%s': %s\n", project_file, strerror(errno));
-        return 1;
+    if (archive) {
+        return archive_file(project_file, argv[3]);
     }
 
-    char buffer[BUFFER_SIZE];
-    size_t bytes_read;
-
-    while ((bytes_read = fread(buffer, 1, sizeof(buffer), stdin)) > 0) {
-        if (fwrite(buffer, 1, bytes_read, file) != bytes_read) {
-            fprintf(stderr, "Failed to write to project '%s': %s\n", project_file, strerror(errno));
-            fclose(file);
+    if (append) {
+        // Appends (journal records, or creating a lock file) keep the file, and the locks held on it, in place
+        FILE *file = fopen(project_file, "a");
+        if (file == NULL) {
+            fprintf(stderr, "Failed to create project '%s': %s\n", project_file, strerror(errno));
             return 1;
         }
+        int failed = copy_input(file, project_file);
+        if (fclose(file) != 0 || failed) {
+            return 1;
+        }
+    } else if (replace_file(project_file) != 0) {
+        return 1;
     }
 
-    fclose(file);
     printf("Project '%s' created/updated successfully.\n", project_file);
     return 0;
 }
@@ -1,27 +1,103 @@
 #include <stdlib.h>
 #include <stdio.h>
+#include <string.h>
+#include <ctype.h>
+#include <errno.h>
 #include <unistd.h>
+#include <sys/types.h>
+#include <sys/wait.h>
 
+#ifndef SCONTROL_PATH
+#define SCONTROL_PATH "/usr/bin/scontrol"
+#endif
+
+// Partition and group names are passed to scontrol as is, restrict them to the characters Slurm names use
+static int is_valid_name(const char *name, int allow_comma) {
+    for (const char *c = name; *c != '\0'; c++) {
+        if (!isalnum((unsigned char) *c) && *c != '_' && *c != '-' && *c != '.' && !(allow_comma && *c == ',')) {
+            return 0;
+        }
+    }
+    return 1;
+}
+
+// Run: scontrol update partitionname=<partition> allowgroups=<groups>
+static int update_partition(const char *partition, const char *groups) {
+    char *partition_arg = malloc(strlen("partitionname=") + strlen(partition) + 1);
+    char *groups_arg = malloc(strlen("allowgroups=") + strlen(groups) + 1);
+    if (partition_arg == NULL || groups_arg == NULL) {
+        perror("malloc");
+        free(partition_arg);
+        free(groups_arg);
+        return 1;
+    }
+    sprintf(partition_arg, "partitionname=%s", partition);
+    sprintf(groups_arg, "allowgroups=%s", groups);
+
+    int status = 1;
+    pid_t pid = fork();
+    if (pid == 0) {
+        char *args[] = {"scontrol", "update", partition_arg, groups_arg, NULL};
+        execv(SCONTROL_PATH, args);
+        perror("execv");
+        _exit(127);
+    } else if (pid < 0) {
+        perror("fork");
+    } else if (waitpid(pid, &status, 0) < 0) {
+        perror("waitpid");
+        status = 1;
+    }
+
+    free(partition_arg);
+    free(groups_arg);
+    return status;
+}
+
+// Reads one "<partition> <group1,group2,...>" line per partition from stdin, of any length, and sets the
+// AllowGroups of each partition to the given groups
 int main(int argc, char *argv[]) {
-    // Check if the correct number of arguments are provided
-    if (argc != 3) {
-        printf("Usage: %s <resource_path> <correct_context>\n", argv[0]);
+    if (argc != 1) {
+        fprintf(stderr, "Usage: %s < updates (one '<partition> <allowgroups>' line per partition)\n", argv[0]);
         return 1;
     }
 
-    // Execute the usermod command with elevated privileges
     if (setuid(0) != 0) {
         perror("setuid");
         return 1;
     }
 
-    // Build the command string
-    char command[256];  // Adjust size as needed
-    snprintf(command, sizeof(command), "scontrol update partitionname=%s allowgroups=%s", argv[1], argv[2]);
+    char *line = NULL;
+    size_t capacity = 0;
+    ssize_t length;
+    int failures = 0;
+
+    while ((length = getline(&line, &capacity, stdin)) != -1) {
+        if (length > 0 && line[length - 1] == '\n') {
+            line[length - 1] = '\0';
+        }
+        if (line[0] == '\0') {
+            continue;
+        }
 
-    // Execute the command
-    int result = system(command);
+        // The AllowGroups may be empty, the separating space is still present
+        char *separator = strchr(line, ' ');
+        char *groups = separator != NULL ? separator + 1 : "";
+        if (separator != NULL) {
+            *separator = '\0';
+        }
+
+        if (line[0] == '\0' || !is_valid_name(line, 0) || !is_valid_name(groups, 1)) {
+            fprintf(stderr, "Invalid partition update '%s'\n", line);
+            failures++;
+            continue;
+        }
+
+        if (update_partition(line, groups) != 0) {
+            fprintf(stderr, "Failed to update partition '%s'\n", line);
+            failures++;
+        }
+    }
 
-    // Check if the command executed successfully
-    return result;
+    free(line);
+    return failures == 0 ? 0 : 1;
 }